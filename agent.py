@@ -1,6 +1,12 @@
 # agent.py
 
+# Compartment order used by every count array and integer-coded state array
+STATES = ('S', 'E', 'I', 'R', 'V')
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+
 class Agent:
+    __slots__ = ('id', 'state', 'mask', 'vaccinated', 'infection_timer', 'ever_infected')
+
     def __init__(self, agent_id, mask=False, vaccinated=False):
         self.id = agent_id
         self.state = 'S'  # S, E, I, R, or V
@@ -8,3 +14,56 @@ class Agent:
         self.vaccinated = vaccinated
         self.infection_timer = 0
         self.ever_infected = False
+
+
+class AgentView:
+    """Agent-compatible view onto one row of a compact Environment.
+
+    Reads and writes go straight to the environment's arrays, so
+    `env.population[i].state = 'E'` updates the uint8 state array.
+    """
+    __slots__ = ('_env', 'id')
+
+    def __init__(self, env, agent_id):
+        self._env = env
+        self.id = agent_id
+
+    @property
+    def state(self):
+        return STATES[self._env.state[self.id]]
+
+    @state.setter
+    def state(self, value):
+        self._env.state[self.id] = STATE_CODES[value]
+
+    @property
+    def mask(self):
+        return bool(self._env.mask[self.id])
+
+    @mask.setter
+    def mask(self, value):
+        self._env.mask[self.id] = value
+
+    @property
+    def vaccinated(self):
+        return bool(self._env.vaccinated[self.id])
+
+    @vaccinated.setter
+    def vaccinated(self, value):
+        self._env.vaccinated[self.id] = value
+
+    @property
+    def infection_timer(self):
+        return int(self._env.infection_timer[self.id])
+
+    @infection_timer.setter
+    def infection_timer(self, value):
+        self._env.infection_timer[self.id] = value
+
+    @property
+    def ever_infected(self):
+        return bool(self._env.ever_infected[self.id])
+
+    @ever_infected.setter
+    def ever_infected(self, value):
+        self._env.ever_infected[self.id] = value
@@ -1,11 +1,26 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from matplotlib.widgets import CheckButtons, Slider, Button
 from matplotlib.gridspec import GridSpec
 
-def animate_epidemic_curve(csv_file="simulation_results.csv"):
-    df = pd.read_csv(csv_file)
+def animate_epidemic_curve(csv_file="simulation_results.csv", out=None, fps=20, key=None):
+    """Interactive animation with play/pause, a day slider and series toggles.
+
+    With `out` (.gif or .mp4) the animation is rendered headless to that file
+    instead (see render.py). With `key` the run is read from the run cache
+    instead of `csv_file`.
+    """
+    df = None
+    if key is not None:
+        from data_collector import load_data
+        df = load_data(key=key)
+    if out is not None:
+        from render import render_animation
+        return render_animation(csv_file if df is None else df, out, fps=fps)
+    if df is None:
+        df = pd.read_csv(csv_file)
     days = df["day"].values
     S = df["S"].values
     E = df["E"].values
@@ -30,6 +45,12 @@ def animate_epidemic_curve(csv_file="simulation_results.csv"):
     line_V, = ax.plot([], [], 'purple', label="Vaccinated")
     ax.legend(loc="upper right")
 
+    # Decimate long series to the axes' pixel width once; frames then slice
+    # these short arrays instead of the full series
+    from render import decimate
+    width = int(ax.get_position().width * fig.bbox.width)
+    series = [decimate(days, y, width) for y in (S, E, I, R, V)]
+
     # Checkboxes in separate panel
     check_ax = fig.add_subplot(gs[0, 1])
     check_ax.axis('off')
@@ -58,11 +79,9 @@ def animate_epidemic_curve(csv_file="simulation_results.csv"):
     current_frame = [days.min()]
 
     def update(current_day):
-        line_S.set_data(days[:current_day], S[:current_day])
-        line_E.set_data(days[:current_day], E[:current_day])
-        line_I.set_data(days[:current_day], I[:current_day])
-        line_R.set_data(days[:current_day], R[:current_day])
-        line_V.set_data(days[:current_day], V[:current_day])
+        for line, (x, y) in zip(lines, series):
+            k = np.searchsorted(x, current_day, side="right")
+            line.set_data(x[:k], y[:k])
         ax.set_title(f"COVID-19 Simulation (SEIRV) — Day {current_day}")
         idx = current_day - 1 if current_day > 0 else 0
         count_text.set_text(
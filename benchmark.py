@@ -0,0 +1,245 @@
+# benchmark.py
+#
+# Throughput and memory benchmarks for Environment construction,
+# Simulation.step, DataCollector.record and ensembles, swept over
+# population sizes and horizons. Each case runs in a fresh worker process
+# with a ResourceMonitor attached, so its peak RSS is its own. Results are
+# JSON; compare() checks a run against a stored baseline and plot_scaling()
+# draws capacity curves from the stored numbers.
+#
+#   python benchmark.py run --populations 1000 100000 --days 50 --out bench.json
+#   python benchmark.py compare bench.json baseline.json --threshold 0.10
+#   python benchmark.py plot bench.json
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+POPULATIONS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+HORIZONS = (50,)
+# The object engine needs minutes per day (and GBs) at 10M agents
+MAX_POPULATION = {"object": 100_000, "numpy": 10_000_000}
+# DataCollector.record() is an O(population) census; skip it above this size
+RECORD_LIMIT = 1_000_000
+ENSEMBLE_RUNS = 20
+# Step cases run an epidemic (config.py's beta 0.1 mostly dies out within a
+# few days, leaving only vaccination to time)
+STEP_BETA = 0.4
+
+
+def _run_case(case):
+    """Run one benchmark case in the current process and return its result dict."""
+    from resource_monitor import ResourceMonitor
+    kind, engine, population, days = case["kind"], case["engine"], case["population"], case["days"]
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor = ResourceMonitor(interval=0.05, csv_path=os.path.join(tmp, "resource_usage.csv"))
+        monitor.start()
+        try:
+            if kind == "step":
+                phases = _time_step_case(engine, population, days)
+                agent_days = population * days
+                elapsed = phases["step"]
+            else:
+                phases = _time_ensemble_case(engine, population, days)
+                agent_days = ENSEMBLE_RUNS * population * days
+                elapsed = phases["ensemble"]
+        finally:
+            monitor.stop()
+    peak_rss = monitor.summary()["peak_total_rss_bytes"]
+    return {**case, "seconds": elapsed, "agent_days_per_s": agent_days / elapsed,
+            "peak_rss_bytes": peak_rss, "phases": phases}
+
+
+def _time_step_case(engine, population, days):
+    """Build, step and census times, plus the StepProfiler phase totals of
+    the steps ("step_phases") and the epidemic's peak E + I."""
+    from simulation import Simulation
+    from ensemble import config_params
+    from profiler import StepProfiler, PHASES
+    from agent import STATES
+    profiler = StepProfiler(horizon=days)
+    start = time.perf_counter()
+    sim = Simulation(population=population, engine=engine, seed=0, horizon=days, profiler=profiler,
+                     **{**config_params(), "beta": STEP_BETA})
+    built = time.perf_counter()
+    for _ in range(days):
+        sim.step()
+    stepped = time.perf_counter()
+    counts = sim.data_collector.to_array()
+    phases = {"build": built - start, "step": stepped - built, "record": None,
+              "step_phases": dict(zip(PHASES, profiler.timings.sum(axis=0).tolist())),
+              "peak_active": int((counts[:, STATES.index('E')] + counts[:, STATES.index('I')]).max())}
+    if population <= RECORD_LIMIT:
+        from data_collector import DataCollector
+        start = time.perf_counter()
+        DataCollector().record(days, sim.environment.population)
+        phases["record"] = time.perf_counter() - start
+    return phases
+
+
+def _time_ensemble_case(engine, population, days):
+    # The replicate loop of run_multiple, without its plot window
+    from ensemble import iter_replicates, config_params
+    from ensemble_stats import EnsembleAggregator
+    start = time.perf_counter()
+    agg = EnsembleAggregator(days, n_runs=ENSEMBLE_RUNS)
+    for counts in iter_replicates(ENSEMBLE_RUNS, population, days, seed=0, engine=engine,
+                                  **config_params()):
+        agg.add(counts)
+    agg.close()
+    return {"ensemble": time.perf_counter() - start}
+
+
+def cases(populations=POPULATIONS, horizons=HORIZONS, engines=("object", "numpy"),
+          kinds=("step", "ensemble")):
+    """Benchmark cases: one per (kind, engine, population, horizon). Ensemble
+    cases only use populations up to 10,000."""
+    out = []
+    for kind in kinds:
+        for engine in engines:
+            for population in populations:
+                if population > MAX_POPULATION[engine] or (kind == "ensemble" and population > 10_000):
+                    continue
+                for days in horizons:
+                    out.append({"kind": kind, "engine": engine, "population": int(population),
+                                "days": int(days)})
+    return out
+
+
+def case_key(result):
+    return (result["kind"], result["engine"], result["population"], result["days"])
+
+
+def run_benchmarks(populations=POPULATIONS, horizons=HORIZONS, engines=("object", "numpy"),
+                   kinds=("step", "ensemble"), out="benchmark_results.json", isolate=True):
+    """Run every case and write {"meta": ..., "results": [...]} to `out`.
+
+    With isolate=True each case runs in its own process so peak RSS and
+    warm caches do not leak between cases.
+    """
+    results = []
+    for case in cases(populations, horizons, engines, kinds):
+        if isolate:
+            with multiprocessing.get_context().Pool(1) as pool:
+                result = pool.apply(_run_case, (case,))
+        else:
+            result = _run_case(case)
+        rss = result["peak_rss_bytes"]
+        print(f"[INFO] {result['kind']:8s} {result['engine']:6s} N={result['population']:>10,d} "
+              f"days={result['days']:>4d}  {result['agent_days_per_s']:>14,.0f} agent-days/s  "
+              f"peak RSS {'N/A' if rss is None else f'{rss / 2**20:,.0f} MiB'}")
+        if "step_phases" in result["phases"]:
+            print("[INFO]     " + ", ".join(f"{name} {seconds:.3f}s"
+                                            for name, seconds in result["phases"]["step_phases"].items())
+                  + f"; peak E+I {result['phases']['peak_active']:,d}")
+        results.append(result)
+    report = {"meta": {"timestamp": datetime.now(timezone.utc).isoformat(),
+                       "python": platform.python_version(), "numpy": np.__version__,
+                       "platform": platform.platform(), "cpu_count": os.cpu_count()},
+              "results": results}
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Benchmark results saved to {out}")
+    return report
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current, baseline, threshold=0.10):
+    """Compare two result files (paths or loaded dicts).
+
+    A case regresses when its throughput falls, or its peak RSS rises, by
+    more than `threshold` (a fraction) relative to the baseline. Cases
+    missing from either side are ignored. Returns a list of
+    (case_key, metric, baseline_value, current_value) for the regressions.
+    """
+    if isinstance(current, str):
+        current = load_results(current)
+    if isinstance(baseline, str):
+        baseline = load_results(baseline)
+    reference = {case_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        base = reference.get(case_key(result))
+        if base is None:
+            continue
+        if result["agent_days_per_s"] < base["agent_days_per_s"] * (1 - threshold):
+            regressions.append((case_key(result), "agent_days_per_s",
+                                base["agent_days_per_s"], result["agent_days_per_s"]))
+        if (result["peak_rss_bytes"] and base["peak_rss_bytes"]
+                and result["peak_rss_bytes"] > base["peak_rss_bytes"] * (1 + threshold)):
+            regressions.append((case_key(result), "peak_rss_bytes",
+                                base["peak_rss_bytes"], result["peak_rss_bytes"]))
+    return regressions
+
+
+def plot_scaling(path="benchmark_results.json", out="benchmark_scaling.png", kind="step"):
+    """Throughput and peak RSS against population (log-log), one line per
+    engine and horizon, from a stored results file."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    results = [r for r in load_results(path)["results"] if r["kind"] == kind]
+    fig, (ax_rate, ax_rss) = plt.subplots(1, 2, figsize=(11, 4))
+    for engine, days in sorted({(r["engine"], r["days"]) for r in results}):
+        rows = sorted((r for r in results if r["engine"] == engine and r["days"] == days),
+                      key=lambda r: r["population"])
+        population = [r["population"] for r in rows]
+        label = f"{engine}, {days} days"
+        ax_rate.plot(population, [r["agent_days_per_s"] for r in rows], "o-", label=label)
+        rss = [(p, r["peak_rss_bytes"] / 2**20) for p, r in zip(population, rows) if r["peak_rss_bytes"]]
+        if rss:
+            ax_rss.plot(*zip(*rss), "o-", label=label)
+    for ax, ylabel in ((ax_rate, "Agent-days per second"), (ax_rss, "Peak RSS (MiB)")):
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("Population")
+        ax.set_ylabel(ylabel)
+        ax.grid(True, which="both", alpha=0.3)
+        ax.legend()
+    fig.suptitle(f"Benchmark scaling ({kind})")
+    fig.tight_layout()
+    fig.savefig(out, dpi=120)
+    plt.close(fig)
+    print(f"[INFO] Scaling plot saved to {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SEIRV benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run", help="run benchmarks and write JSON results")
+    run_p.add_argument("--populations", type=int, nargs="+", default=list(POPULATIONS))
+    run_p.add_argument("--days", type=int, nargs="+", default=list(HORIZONS))
+    run_p.add_argument("--engines", nargs="+", default=["object", "numpy"])
+    run_p.add_argument("--kinds", nargs="+", default=["step", "ensemble"])
+    run_p.add_argument("--out", default="benchmark_results.json")
+    cmp_p = sub.add_parser("compare", help="compare results against a baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("--threshold", type=float, default=0.10)
+    plot_p = sub.add_parser("plot", help="plot scaling curves from stored results")
+    plot_p.add_argument("results")
+    plot_p.add_argument("--out", default="benchmark_scaling.png")
+    plot_p.add_argument("--kind", default="step")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_benchmarks(args.populations, args.days, args.engines, args.kinds, args.out)
+    elif args.command == "compare":
+        regressions = compare(args.current, args.baseline, args.threshold)
+        for key, metric, base, value in regressions:
+            print(f"[ERROR] {key}: {metric} {base:,.0f} -> {value:,.0f}")
+        print(f"[INFO] {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+    else:
+        plot_scaling(args.results, args.out, args.kind)
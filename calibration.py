@@ -0,0 +1,218 @@
+# calibration.py
+#
+# ABC-SMC calibration of Simulation parameters (by default beta,
+# mask_effect and vaccine_effect) to an observed prevalence (I) or daily
+# incidence (S→E) series, after Toni et al. (2009) with the Beaumont et al.
+# (2009) kernel: each generation resamples the previous particles,
+# perturbs them with a Gaussian of twice their weighted covariance and keeps
+# proposals whose distance to the data is within the generation's tolerance.
+#
+# The distance is the RMSE over the observed days. Every proposal first goes
+# through a cheap deterministic pre-screen (the mean-field ODE of
+# ode.solve_seirv, a whole batch in one call); survivors run the ABM in a
+# process pool, day by day, and stop as soon as the error accumulated so far
+# already exceeds the tolerance. Proposal batches and their seeds are drawn
+# in the parent from (seed, generation, index), so the result does not
+# depend on the number of workers.
+
+import math
+import multiprocessing
+import numpy as np
+from agent import STATES
+from numpy_engine import CONTACTS_PER_DAY
+
+PRIORS = {"beta": (0.01, 1.0), "mask_effect": (0.0, 1.0), "vaccine_effect": (0.0, 1.0)}
+KINDS = ("prevalence", "incidence")
+BATCH = 64  # proposals drawn, pre-screened and evaluated together
+
+
+def _evaluate(task):
+    """Run one proposal until the running RMSE exceeds `epsilon`.
+
+    Returns (distance, days simulated); distance is inf when rejected early.
+    """
+    from simulation import Simulation
+    params, seed, sim_kwargs, observed, kind, epsilon = task
+    days = len(observed)
+    budget = epsilon ** 2 * days  # reject once the squared error passes this
+    sim = Simulation(seed=seed, horizon=days, track_incidence=True, **sim_kwargs, **params)
+    collector = sim.data_collector
+    error = 0.0
+    previous = collector.ever_infected
+    for day in range(days):
+        sim.step()
+        cumulative = collector.ever_infected
+        value = collector.current[STATES.index('I')] if kind == "prevalence" else cumulative - previous
+        previous = cumulative
+        error += (value - observed[day]) ** 2
+        if error > budget:
+            sim.close()
+            return math.inf, day + 1
+        if sim.burned_out():
+            # Nothing more can be infected: the rest of the simulated series is 0
+            error += float(np.sum(np.square(observed[day + 1:])))
+            sim.close()
+            return (math.inf if error > budget else math.sqrt(error / days)), day + 1
+    sim.close()
+    return math.sqrt(error / days), days
+
+
+def ode_series(params, population, days, kind="prevalence", sim_kwargs=None):
+    """Mean-field ODE prediction for a batch of proposals, shape (B, days).
+
+    The ABM's per-contact beta becomes the rate CONTACTS_PER_DAY * beta,
+    scaled by the average mask and vaccine protection of a random contact
+    pair at the initial coverages.
+    """
+    from ode import solve_seirv
+    from ensemble import config_params
+    base = {**config_params(), "mask_rate": 0.6, "vaccine_rate": 0.4, **(sim_kwargs or {})}
+    n = len(next(iter(params.values())))
+    value = {name: np.broadcast_to(np.asarray(params.get(name, base[name]), dtype=float), (n,))
+             for name in ("beta", "sigma", "gamma", "nu", "mask_effect", "vaccine_effect")}
+    masked_pair = 1 - (1 - base["mask_rate"]) ** 2
+    protection = (1 - value["mask_effect"] * masked_pair) * (1 - value["vaccine_effect"] * base["vaccine_rate"])
+    rate = min(CONTACTS_PER_DAY, population) * value["beta"] * protection
+    t = np.arange(days + 1, dtype=float)
+    sol = solve_seirv(t, rate, value["sigma"], value["gamma"], value["nu"], N=population, I0=1, cache=False)
+    sol = sol.reshape(n, days + 1, 5)
+    if kind == "prevalence":
+        return sol[:, 1:, STATES.index('I')]
+    ever = population - sol[:, :, STATES.index('S')] - sol[:, :, STATES.index('V')]
+    return np.diff(ever, axis=1)
+
+
+def _kernel_density(points, centres, weights, cov_inv, norm):
+    """Sum_j w_j N(points | centres_j, cov) for every point."""
+    diff = points[:, None, :] - centres[None, :, :]
+    mahal = np.einsum("ijk,kl,ijl->ij", diff, cov_inv, diff)
+    return (weights[None, :] * np.exp(-0.5 * mahal)).sum(axis=1) / norm
+
+
+def abc_smc(observed, population, kind="prevalence", priors=None, n_particles=200, generations=5,
+            quantile=0.5, epsilon0=math.inf, prescreen=2.0, n_workers=1, seed=None,
+            max_attempts=None, sim_kwargs=None):
+    """Fit `priors` (name -> (low, high), uniform; default PRIORS) to an
+    observed series of length `days` (day 1 first).
+
+    kind: "prevalence" compares daily I counts, "incidence" daily new
+    infections. Generation 0 accepts prior draws within `epsilon0`; each
+    later tolerance is the `quantile` of the previous generation's accepted
+    distances. prescreen: a proposal whose ODE prediction is more than
+    prescreen * epsilon from the data is discarded without an ABM run
+    (None disables the pre-screen). sim_kwargs: fixed Simulation arguments
+    (default engine="numpy" plus config.py parameters). A generation stops
+    after `max_attempts` proposals (default 100 * n_particles) and the
+    calibration ends there.
+
+    Returns a dict with the final "particles" (n, k), "weights", "distances",
+    "names", "epsilon" and a per-generation "history" of tolerances,
+    acceptance rates and counts of pre-screened, early-rejected and
+    completed simulations.
+    """
+    from ensemble import config_params, replicate_seed
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind '{kind}'; expected one of {KINDS}")
+    priors = dict(priors or PRIORS)
+    names = list(priors)
+    low = np.array([priors[n][0] for n in names], dtype=float)
+    high = np.array([priors[n][1] for n in names], dtype=float)
+    if np.any(high <= low):
+        raise ValueError("Every prior needs low < high")
+    sim_kwargs = {**config_params(), "engine": "numpy", **(sim_kwargs or {})}
+    fixed = {k: v for k, v in sim_kwargs.items() if k not in priors}
+    fixed["population"] = population
+    observed = np.asarray(observed, dtype=float)
+    days = len(observed)
+    max_attempts = max_attempts or 100 * n_particles
+
+    base = np.random.SeedSequence(seed).entropy
+    pool = multiprocessing.get_context().Pool(n_workers) if n_workers > 1 else None
+    evaluate = (lambda tasks: pool.map(_evaluate, tasks, chunksize=1)) if pool else (lambda tasks: list(map(_evaluate, tasks)))
+
+    particles = weights = distances = None
+    epsilon = epsilon0
+    history = []
+    try:
+        for gen in range(generations):
+            rng = np.random.default_rng(np.random.SeedSequence(base, spawn_key=(gen,)))
+            if gen > 0:
+                epsilon = float(np.quantile(distances, quantile))
+                cov = 2 * np.atleast_2d(np.cov(particles, rowvar=False, aweights=weights))
+                cov += np.eye(len(names)) * 1e-12
+                chol = np.linalg.cholesky(cov)
+                cov_inv = np.linalg.inv(cov)
+                norm = math.sqrt((2 * math.pi) ** len(names) * np.linalg.det(cov))
+            accepted, accepted_d = [], []
+            stats = {"generation": gen, "epsilon": epsilon, "proposals": 0, "prescreened": 0,
+                     "early_rejected": 0, "simulated_days": 0}
+            index = 0
+            while len(accepted) < n_particles and stats["proposals"] < max_attempts:
+                # Draw a batch of proposals inside the prior support
+                if gen == 0:
+                    batch = low + rng.random((BATCH, len(names))) * (high - low)
+                else:
+                    picks = rng.choice(len(particles), size=4 * BATCH, p=weights)
+                    batch = particles[picks] + rng.standard_normal((4 * BATCH, len(names))) @ chol.T
+                    batch = batch[np.all((batch >= low) & (batch <= high), axis=1)][:BATCH]
+                stats["proposals"] += len(batch)
+                keep = np.ones(len(batch), dtype=bool)
+                if prescreen is not None and math.isfinite(epsilon) and len(batch):
+                    predicted = ode_series({n: batch[:, k] for k, n in enumerate(names)},
+                                           population, days, kind, sim_kwargs)
+                    ode_distance = np.sqrt(np.mean((predicted - observed) ** 2, axis=1))
+                    keep = ode_distance <= prescreen * epsilon
+                    stats["prescreened"] += int((~keep).sum())
+                tasks = [(dict(zip(names, map(float, theta))), replicate_seed(base, gen, index + i),
+                          fixed, observed, kind, epsilon)
+                         for i, theta in enumerate(batch) if keep[i]]
+                index += len(batch)
+                for theta, (d, ran) in zip(batch[keep], evaluate(tasks)):
+                    stats["simulated_days"] += ran
+                    if not math.isfinite(d) or d > epsilon:
+                        stats["early_rejected"] += not math.isfinite(d)
+                        continue
+                    if len(accepted) < n_particles:
+                        accepted.append(theta)
+                        accepted_d.append(d)
+            if len(accepted) < n_particles:
+                print(f"[INFO] Generation {gen}: only {len(accepted)} of {n_particles} particles after "
+                      f"{stats['proposals']} proposals (epsilon={epsilon:.3g}); stopping")
+                if gen > 0:
+                    epsilon = history[-1]["epsilon"]  # keep the previous generation's particles
+                    break
+                if not accepted:
+                    raise ValueError("No proposal was accepted in generation 0; raise epsilon0")
+            new = np.array(accepted)
+            if gen == 0:
+                new_weights = np.ones(len(new))
+            else:
+                new_weights = 1.0 / _kernel_density(new, particles, weights, cov_inv, norm)
+            particles, weights, distances = new, new_weights / new_weights.sum(), np.array(accepted_d)
+            stats["acceptance_rate"] = len(accepted) / stats["proposals"]
+            history.append(stats)
+            print(f"[INFO] Generation {gen}: epsilon={epsilon:.3g}, acceptance {stats['acceptance_rate']:.1%}, "
+                  f"{stats['prescreened']} pre-screened, {stats['early_rejected']} stopped early, "
+                  f"{stats['simulated_days']} simulated days")
+            if len(accepted) < n_particles:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return {"names": names, "particles": particles, "weights": weights, "distances": distances,
+            "epsilon": epsilon, "history": history}
+
+
+def posterior_summary(result, quantiles=(0.05, 0.5, 0.95)):
+    """Name -> {"mean": ..., "q05": ..., ...} from weighted particles."""
+    out = {}
+    for k, name in enumerate(result["names"]):
+        values, weights = result["particles"][:, k], result["weights"]
+        order = np.argsort(values)
+        cdf = np.cumsum(weights[order])
+        summary = {"mean": float(np.sum(values * weights))}
+        for q in quantiles:
+            summary[f"q{round(q * 100):02d}"] = float(values[order][min(np.searchsorted(cdf, q), len(cdf) - 1)])
+        out[name] = summary
+    return out
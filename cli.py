@@ -0,0 +1,210 @@
+# cli.py
+#
+# Command-line entry point. Scenarios are JSON files holding Simulation
+# keyword arguments plus run options; anything missing falls back to
+# config.py. pandas, matplotlib and scipy are imported only by the
+# subcommands that use them, so `simulate` and `ensemble` start in about the
+# time it takes to import numpy.
+#
+#   python cli.py simulate scenario.json --out results.csv
+#   python cli.py ensemble scenario.json --runs 200 --workers 8 --tol 0.05
+#   python cli.py validate --check engines startup
+#   python cli.py plot results.csv --out curve.png
+#
+# Example scenario:
+#   {"population": 10000, "engine": "numpy", "beta": 0.2, "seed": 7, "days": 200}
+
+import argparse
+import csv
+import json
+import sys
+
+SCENARIO_OPTIONS = {"days": 200, "runs": 50, "workers": 1, "tol": None, "min_runs": 10}
+# Constructor arguments that cannot come from JSON
+_NOT_IN_SCENARIO = ("environment", "profiler", "incubation", "infectious_period")
+CHECKS = ("ode", "engines", "compartmental", "fast_forward", "sharded", "calibration", "startup")
+
+
+def load_scenario(path=None):
+    """(Simulation kwargs, run options) from a JSON scenario file.
+
+    Parameters not in the file come from config.py (see
+    ensemble.config_params), options from SCENARIO_OPTIONS. Unknown keys
+    raise ValueError.
+    """
+    import inspect
+    from ensemble import config_params
+    from simulation import Simulation
+    scenario = {}
+    if path is not None:
+        with open(path) as f:
+            scenario = json.load(f)
+    allowed = set(inspect.signature(Simulation).parameters) - set(_NOT_IN_SCENARIO) - {"horizon"}
+    unknown = set(scenario) - allowed - set(SCENARIO_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown scenario keys {sorted(unknown)}; expected Simulation arguments "
+                         f"or {sorted(SCENARIO_OPTIONS)}")
+    options = {name: scenario.pop(name, default) for name, default in SCENARIO_OPTIONS.items()}
+    return {**config_params(), **scenario}, options
+
+
+def write_columns(path, columns):
+    """Write {name: sequence} as CSV columns (without pandas)."""
+    names = list(columns)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(names)
+        writer.writerows(zip(*(columns[name] for name in names)))
+
+
+def cmd_simulate(args):
+    sim_kwargs, options = load_scenario(args.scenario)
+    days = args.days or options["days"]
+    if sim_kwargs.get("seed") is not None and not args.no_cache:
+        from run_cache import default_cache
+        key, collector = default_cache().run(days, **sim_kwargs)
+        print(f"[INFO] Run key: {key}")
+    else:
+        from simulation import Simulation
+        sim = Simulation(horizon=days, **sim_kwargs)
+        sim.run(days)
+        sim.close()
+        collector = sim.data_collector
+    if args.out.endswith(".npy"):
+        import numpy as np
+        np.save(args.out, collector.to_array())
+        print(f"[INFO] Counts saved to {args.out}")
+    else:
+        collector.to_csv(args.out)
+    from agent import STATES
+    final = collector.to_array()[-1]
+    print("[INFO] Day " + str(days) + ": " + ", ".join(f"{s}={c}" for s, c in zip(STATES, final)))
+
+
+def cmd_ensemble(args):
+    import numpy as np
+    from ensemble import iter_replicates
+    from ensemble_stats import EnsembleAggregator, ConvergenceTracker
+    sim_kwargs, options = load_scenario(args.scenario)
+    days = args.days or options["days"]
+    runs = args.runs or options["runs"]
+    tol = args.tol if args.tol is not None else options["tol"]
+    seed = np.random.SeedSequence(sim_kwargs.pop("seed", None)).entropy
+    population = sim_kwargs.pop("population", 1000)
+    print(f"[INFO] Ensemble seed: {seed}")
+    tracker = None if tol is None else ConvergenceTracker(days, tol=tol, min_runs=options["min_runs"])
+    agg = EnsembleAggregator(days)
+    for counts in iter_replicates(runs, population, days, n_workers=args.workers or options["workers"],
+                                  seed=seed, tracker=tracker, **sim_kwargs):
+        agg.add(counts)
+    write_columns(args.out, {"Day": range(days), **agg.summary_columns()})
+    print(f"[INFO] {agg.count} runs summarised in {args.out}")
+
+
+def cmd_validate(args):
+    """Run the checks; with a scenario every check except "startup" (which
+    takes none) uses the parameters, population, days and seed the file
+    sets. Keys the file leaves out keep each check's own defaults (not
+    config.py's), so e.g. the epidemic beta of compare_engines stays."""
+    import validation
+    from compartmental import PARAMETERS
+    if args.scenario is not None and "startup" in args.check:
+        raise ValueError("The startup check does not take a scenario")
+    sim_kwargs, options = load_scenario(args.scenario)
+    params = {k: sim_kwargs[k] for k in ("beta", "sigma", "gamma", "nu")}
+    run, model, simulation = {}, {}, {}
+    if args.scenario is not None:
+        with open(args.scenario) as f:
+            given = json.load(f)
+        run = {k: given[k] for k in ("population", "days", "seed") if given.get(k) is not None}
+        # Model parameters for the surrogate, sharded and calibration checks;
+        # every Simulation argument for the checks that build Simulations
+        model = {k: v for k, v in given.items() if k in PARAMETERS}
+        simulation = {k: v for k, v in given.items()
+                      if k in sim_kwargs and k not in ("engine", "population", "seed")}
+    failed = []
+    for check in args.check:
+        try:
+            if check == "ode":
+                validation.run_validation(**params, N=sim_kwargs.get("population", 1000),
+                                          days=options["days"], overlay_abm=False)
+            elif check == "startup":
+                validation.check_startup()
+            elif check == "calibration":
+                validation.check_calibration(**run, **model)
+            elif check in ("engines", "fast_forward"):
+                getattr(validation, f"compare_{check}")(**run, **simulation)
+            else:
+                getattr(validation, f"compare_{check}")(**run, **model)
+        except AssertionError as e:
+            print(f"[ERROR] {check}: {e}")
+            failed.append(check)
+    return 1 if failed else 0
+
+
+def cmd_plot(args):
+    source = args.source
+    if args.key is not None:
+        from data_collector import load_data
+        source = load_data(key=args.key)
+        if source is None:
+            return 1
+    if args.out is None:
+        if args.animate:
+            from animated_epidemic_curve import animate_epidemic_curve
+            animate_epidemic_curve(args.source, key=args.key)
+        else:
+            from visualization import plot_epidemic_curve
+            plot_epidemic_curve(args.source, key=args.key)
+    else:
+        import render
+        (render.render_animation if args.animate else render.render_curve)(source, args.out)
+        print(f"[INFO] Figure saved to {args.out}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SEIRV agent-based model")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sim_p = sub.add_parser("simulate", help="run one simulation (cached when the scenario has a seed)")
+    sim_p.add_argument("scenario", nargs="?")
+    sim_p.add_argument("--days", type=int)
+    sim_p.add_argument("--out", default="simulation_results.csv", help=".csv or .npy")
+    sim_p.add_argument("--no-cache", action="store_true")
+    sim_p.set_defaults(func=cmd_simulate)
+
+    ens_p = sub.add_parser("ensemble", help="run replicates and write the mean / quantile CSV")
+    ens_p.add_argument("scenario", nargs="?")
+    ens_p.add_argument("--days", type=int)
+    ens_p.add_argument("--runs", type=int, help="number of runs (the cap with --tol)")
+    ens_p.add_argument("--workers", type=int)
+    ens_p.add_argument("--tol", type=float, help="stop once targets' CIs are within this relative width")
+    ens_p.add_argument("--out", default="simulation_results_mean.csv")
+    ens_p.set_defaults(func=cmd_ensemble)
+
+    val_p = sub.add_parser("validate", help="run validation checks")
+    val_p.add_argument("scenario", nargs="?")
+    val_p.add_argument("--check", nargs="+", choices=CHECKS, default=["engines"])
+    val_p.set_defaults(func=cmd_validate)
+
+    plot_p = sub.add_parser("plot", help="plot a results CSV or cached run")
+    plot_p.add_argument("source", nargs="?", default="simulation_results.csv")
+    plot_p.add_argument("--key", help="run cache key instead of a CSV")
+    plot_p.add_argument("--out", help="write to a file (headless) instead of opening a window")
+    plot_p.add_argument("--animate", action="store_true")
+    plot_p.set_defaults(func=cmd_plot)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args) or 0
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
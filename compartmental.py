@@ -0,0 +1,218 @@
+# compartmental.py
+#
+# Stochastic compartmental surrogate for well-mixed runs: the same SEIRV
+# transitions as Simulation, tracked as counts instead of agents. Susceptibles
+# are split by (mask, vaccinated) and E / I by mask, so the force of infection
+# uses the same beta, mask_effect, vaccine_effect, coverages and contact
+# number as the agent-based model:
+#
+#   hazard per day of a susceptible with mask m_j, vaccinated v_j
+#     = CONTACTS_PER_DAY / N * beta * (1 - e_v v_j) * sum_i (1 - e_m [m_i or m_j])
+#
+# summed over infectious agents i. method="tau" leaps one day at a time with
+# binomial draws in the ABM's phase order, vectorised over a batch of
+# replicates and is the surrogate ensembles and sweeps use (engine="tau").
+# method="gillespie" is the exact stochastic simulation algorithm for the
+# continuous-time version of the same model. Its exponential dwell times do
+# not reproduce the ABM's daily ones (peaks and final sizes come out
+# smaller) and it is no faster than the numpy engine, so it is not offered
+# as an engine.
+
+import math
+import multiprocessing
+import random
+import numpy as np
+from numpy_engine import CONTACTS_PER_DAY
+
+METHODS = ("tau", "gillespie")
+PARAMETERS = ("beta", "sigma", "gamma", "nu", "mask_effect", "vaccine_effect",
+              "mask_rate", "vaccine_rate")
+DEFAULTS = dict(beta=0.10, sigma=0.20, gamma=0.14, nu=0.02, mask_effect=0.60,
+                vaccine_effect=0.85, mask_rate=0.6, vaccine_rate=0.4)
+BATCH = 256  # replicates per vectorised tau-leaping batch
+
+
+def _rate(p):
+    """Rate whose exit probability over one day is p."""
+    return math.inf if p >= 1 else -math.log1p(-p)
+
+
+def _params(kwargs):
+    unknown = set(kwargs) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Compartmental engine does not support {sorted(unknown)}; "
+                         f"parameters are {PARAMETERS}")
+    return {**DEFAULTS, **kwargs}
+
+
+def _initial(rng, n, population, mask_rate, vaccine_rate):
+    """Initial S split by (mask, vaccinated) and the index case's mask, like
+    Environment: every agent draws its flags, then agent 0 is infectious."""
+    probs = [(1 - mask_rate) * (1 - vaccine_rate), (1 - mask_rate) * vaccine_rate,
+             mask_rate * (1 - vaccine_rate), mask_rate * vaccine_rate]
+    S = rng.multinomial(population - 1, probs, size=n).reshape(n, 2, 2)  # [mask, vaccinated]
+    index_mask = (rng.random(n) < mask_rate).astype(np.int64)
+    return S, index_mask
+
+
+def simulate_tau(n_runs, population, timesteps, seed=None, **params):
+    """Binomial tau-leaping with a leap of one day (the ABM's time step) for
+    `n_runs` replicates at once.
+
+    Each day follows Simulation.step's phase order: infections drawn from
+    the infectious count at the start of the day, then E→I over all exposed
+    (including today's), I→R over the day's starting infectious, then S→V
+    over the remaining susceptibles. Returns (n_runs, timesteps, 5) int32
+    S, E, I, R, V counts for days 1..timesteps, the layout of
+    DataCollector.to_array().
+    """
+    p = _params(params)
+    rng = np.random.default_rng(seed)
+    S, index_mask = _initial(rng, n_runs, population, p["mask_rate"], p["vaccine_rate"])
+    E = np.zeros((n_runs, 2), dtype=np.int64)
+    I = np.zeros((n_runs, 2), dtype=np.int64)
+    I[np.arange(n_runs), index_mask] = 1
+    R = np.zeros(n_runs, dtype=np.int64)
+    V = np.zeros(n_runs, dtype=np.int64)
+
+    contact = min(CONTACTS_PER_DAY, population) / population * p["beta"]
+    e_m, e_v = p["mask_effect"], p["vaccine_effect"]
+    protect_v = np.array([1.0, 1 - e_v])
+
+    out = np.empty((n_runs, timesteps, 5), dtype=np.int32)
+    for day in range(timesteps):
+        # Infectious pressure on unmasked (index 0) and masked (1) susceptibles
+        pressure = np.stack([I[:, 0] + I[:, 1] * (1 - e_m), (I[:, 0] + I[:, 1]) * (1 - e_m)], axis=1)
+        hazard = contact * pressure[:, :, None] * protect_v  # (runs, mask, vaccinated)
+        infected = rng.binomial(S, -np.expm1(-hazard))
+        S -= infected
+        E += infected.sum(axis=2)
+        progressed = rng.binomial(E, p["sigma"])
+        recovered = rng.binomial(I, p["gamma"])
+        E -= progressed
+        I += progressed - recovered
+        R += recovered.sum(axis=1)
+        vaccinated = rng.binomial(S, p["nu"])
+        S -= vaccinated
+        V += vaccinated.sum(axis=(1, 2))
+        out[:, day] = np.stack([S.sum(axis=(1, 2)), E.sum(axis=1), I.sum(axis=1), R, V], axis=1)
+    return out
+
+
+def simulate_gillespie(population, timesteps, seed=None, **params):
+    """Exact SSA of the continuous-time version of the model for one
+    replicate; returns (timesteps, 5) int32 counts at the end of days
+    1..timesteps.
+
+    Rates approximate the ABM's mean durations: an ABM agent starts
+    transmitting on average 1 / sigma - 1/2 days after infection (it can
+    progress on the day it is exposed) and transmits for 1 / gamma days, so
+    E→I runs at 1 / (1 / sigma - 1/2) and I→R at gamma. S→V runs at
+    -log(1 - nu), which keeps the daily vaccination probability. This is
+    not a stand-in for the ABM; see the module comment.
+    """
+    p = _params(params)
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    S_init, index_mask = _initial(np_rng, 1, population, p["mask_rate"], p["vaccine_rate"])
+    S = [int(S_init[0, m, v]) for m in (0, 1) for v in (0, 1)]  # order (m, v) = 00, 01, 10, 11
+    E = [0, 0]
+    I = [0, 0]
+    I[int(index_mask[0])] = 1
+    R = V = 0
+
+    contact = min(CONTACTS_PER_DAY, population) / population * p["beta"]
+    e_m, e_v = p["mask_effect"], p["vaccine_effect"]
+    sigma = math.inf if p["sigma"] >= 2 / 3 else 1 / (1 / p["sigma"] - 0.5)
+    gamma, nu = p["gamma"], _rate(p["nu"])
+    protect = [(m, 1 - e_v if v else 1.0) for m in (0, 1) for v in (0, 1)]
+
+    out = np.empty((timesteps, 5), dtype=np.int32)
+    t = 0.0
+    day = 0
+    while day < timesteps:
+        pressure = (I[0] + I[1] * (1 - e_m), (I[0] + I[1]) * (1 - e_m))
+        rates = [contact * pressure[m] * pv * s for (m, pv), s in zip(protect, S)]
+        rates += [nu * s for s in S]
+        rates += [sigma * E[0], sigma * E[1], gamma * I[0], gamma * I[1]]
+        total = sum(rates)
+        t = t + rng.expovariate(total) if total > 0 else math.inf
+        while day < timesteps and t >= day + 1:
+            out[day] = (sum(S), E[0] + E[1], I[0] + I[1], R, V)
+            day += 1
+        if day >= timesteps:
+            break
+        # Pick the reaction
+        u = rng.random() * total
+        k = 0
+        while u >= rates[k] and k < len(rates) - 1:
+            u -= rates[k]
+            k += 1
+        if k < 4:            # infection of susceptible group k
+            S[k] -= 1
+            E[k // 2] += 1
+        elif k < 8:          # vaccination
+            S[k - 4] -= 1
+            V += 1
+        elif k < 10:         # E -> I
+            E[k - 8] -= 1
+            I[k - 8] += 1
+        else:                # I -> R
+            I[k - 10] -= 1
+            R += 1
+    return out
+
+
+def to_collector(counts, track_incidence=False):
+    """DataCollector holding one replicate's (timesteps, 5) counts as days 1..T."""
+    from data_collector import DataCollector
+    collector = DataCollector(horizon=len(counts), track_incidence=track_incidence)
+    for day, row in enumerate(np.asarray(counts).tolist(), start=1):
+        collector.record_counts(day, row)
+    return collector
+
+
+def _tau_batch(task):
+    seed, n, population, timesteps, params = task
+    return simulate_tau(n, population, timesteps, seed=seed, **params)
+
+
+def _gillespie_task(task):
+    seed, population, timesteps, params = task
+    return simulate_gillespie(population, timesteps, seed=seed, **params)
+
+
+def iter_replicates(n_runs, population, timesteps, method="tau", n_workers=1, seed=None, **params):
+    """Yield (timesteps, 5) count arrays in run order, like ensemble.iter_replicates.
+
+    Tau-leaping runs in batches of BATCH replicates; batch b (or Gillespie
+    replicate r) is seeded from (seed, b) (or (seed, r)), so results do not
+    depend on the worker count.
+    """
+    from ensemble import replicate_seed
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}'; expected one of {METHODS}")
+    _params(params)
+    base = np.random.SeedSequence(seed).entropy
+    if method == "tau":
+        func = _tau_batch
+        tasks = [(replicate_seed(base, b), min(BATCH, n_runs - start), population, timesteps, params)
+                 for b, start in enumerate(range(0, n_runs, BATCH))]
+    else:
+        func = _gillespie_task
+        tasks = [(replicate_seed(base, r), population, timesteps, params) for r in range(n_runs)]
+    if n_workers <= 1:
+        results = map(func, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.get_context().Pool(n_workers)
+        results = pool.imap(func, tasks)
+    try:
+        for result in results:
+            if method == "tau":
+                yield from result
+            else:
+                yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
@@ -5,6 +5,8 @@ GAMMA = 0.14        # Recovery rate
 NU = 0.02         # Vaccination rate
 MASK_EFFECT = 0.6   # Chu et al., 2020
 VACC_EFFECT = 0.85  # Bubar et al., 2021
+SEED = None         # an integer makes main.py reproducible and caches its run
+WRITE_CSV = False   # with SEED set, also write simulation_results.csv
 
 
 # Initial Values
@@ -0,0 +1,141 @@
+# contact_network.py
+#
+# Contact structure for Simulation(network=...). Graphs are stored in
+# compressed sparse row (CSR) form: the neighbours of agent i are
+# indices[indptr[i]:indptr[i + 1]]. Generators build the CSR arrays directly
+# from NumPy edge lists, and networks save to / memory-map from a directory
+# of .npy files so a large graph is built once and reused across runs.
+
+import json
+import os
+import numpy as np
+
+
+class ContactNetwork:
+    """Undirected contact graph in CSR form."""
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    @property
+    def n_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self):
+        """Number of undirected edges (each is stored in both directions)."""
+        return len(self.indices) // 2
+
+    def degree(self, nodes=None):
+        degrees = np.diff(self.indptr)
+        return degrees if nodes is None else degrees[nodes]
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def gather(self, nodes):
+        """All edges out of `nodes` in one pass: returns (sources, targets)."""
+        nodes = np.asarray(nodes)
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        # Position of every gathered edge in `indices`: each node's run starts
+        # at its indptr offset and counts up by one
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        positions = offsets + np.arange(total)
+        return np.repeat(nodes, counts), self.indices[positions]
+
+    def save(self, path):
+        """Write the network to directory `path` (indptr.npy, indices.npy, meta.json)."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "indptr.npy"), self.indptr)
+        np.save(os.path.join(path, "indices.npy"), self.indices)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"n_nodes": self.n_nodes, "n_edges": self.n_edges}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved network; with mmap=True the arrays are memory-mapped read-only."""
+        mode = "r" if mmap else None
+        return cls(np.load(os.path.join(path, "indptr.npy"), mmap_mode=mode),
+                   np.load(os.path.join(path, "indices.npy"), mmap_mode=mode))
+
+
+def from_edges(n, src, dst):
+    """Build a ContactNetwork from undirected edge lists, dropping self-loops
+    and duplicate edges."""
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    keep = src != dst
+    src, dst = src[keep], dst[keep]
+    # Store both directions, then sort by (source, target) and dedupe
+    both_src = np.concatenate([src, dst])
+    both_dst = np.concatenate([dst, src])
+    edge_ids = both_src * n + both_dst
+    edge_ids.sort()
+    edge_ids = edge_ids[np.concatenate([[True], edge_ids[1:] != edge_ids[:-1]])]
+    sources, targets = np.divmod(edge_ids, n)
+    index_dtype = np.int32 if n < 2**31 else np.int64
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return ContactNetwork(indptr, targets.astype(index_dtype))
+
+
+def combine(*networks):
+    """Union of several layers over the same agents (e.g. households + workplaces)."""
+    n = networks[0].n_nodes
+    srcs, dsts = zip(*(net.gather(np.arange(n)) for net in networks))
+    return from_edges(n, np.concatenate(srcs), np.concatenate(dsts))
+
+
+def erdos_renyi(n, mean_degree, seed=None):
+    """G(n, m) random graph with m = n * mean_degree / 2 edges."""
+    rng = np.random.default_rng(seed)
+    m = int(round(n * mean_degree / 2))
+    return from_edges(n, rng.integers(0, n, m), rng.integers(0, n, m))
+
+
+def watts_strogatz(n, k, p, seed=None):
+    """Ring lattice where each agent links to its k nearest neighbours (k even),
+    with each edge's far end rewired to a random agent with probability p."""
+    rng = np.random.default_rng(seed)
+    src = np.repeat(np.arange(n), k // 2)
+    dst = (src + np.tile(np.arange(1, k // 2 + 1), n)) % n
+    rewire = rng.random(src.size) < p
+    dst[rewire] = rng.integers(0, n, int(rewire.sum()))
+    return from_edges(n, src, dst)
+
+
+def _group_edges(members, group_size, contacts_per_member, rng):
+    """Edges inside consecutive groups of `members`: full cliques, or each
+    member linked to `contacts_per_member` random others in its group."""
+    group = np.arange(members.size) // group_size
+    if contacts_per_member is None:
+        # Clique: pair every member with every later member of its group
+        offsets = np.arange(1, group_size)
+        src = np.repeat(np.arange(members.size), offsets.size)
+        dst = src + np.tile(offsets, members.size)
+        ok = (dst < members.size)
+        ok[ok] = group[dst[ok]] == group[src[ok]]
+        return members[src[ok]], members[dst[ok]]
+    src = np.repeat(np.arange(members.size), contacts_per_member)
+    start = group[src] * group_size
+    size = np.minimum(group_size, members.size - start)
+    dst = start + rng.integers(0, 2**62, src.size) % size
+    return members[src], members[dst]
+
+
+def household_workplace(n, household_size=4, workplace_size=20, employment_rate=0.6,
+                        workplace_contacts=8, seed=None):
+    """Two-layer network: households are cliques of `household_size`; a fraction
+    `employment_rate` of agents is split into workplaces of `workplace_size`,
+    where each worker has `workplace_contacts` random colleagues."""
+    rng = np.random.default_rng(seed)
+    home_src, home_dst = _group_edges(rng.permutation(n), household_size, None, rng)
+    workers = rng.permutation(n)[:int(n * employment_rate)]
+    work_src, work_dst = _group_edges(workers, workplace_size, workplace_contacts, rng)
+    return from_edges(n, np.concatenate([home_src, work_src]), np.concatenate([home_dst, work_dst]))
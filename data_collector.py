@@ -1,10 +1,25 @@
 # data_collector.py
+#
+# pandas is imported only by the functions that build DataFrames, so
+# importing Simulation stays cheap for headless workers.
 
-import pandas as pd
+import csv
+import numpy as np
+from agent import STATES, STATE_CODES
 
+_S, _E = STATE_CODES['S'], STATE_CODES['E']
 
-def load_data(filename="simulation_results.csv"):
-    """Loads agent-based simulation results from CSV file."""
+
+def load_data(filename="simulation_results.csv", key=None, cache=None):
+    """Loads agent-based simulation results from CSV file, or with `key`
+    from the run cache (see run_cache.py) without touching any CSV."""
+    if key is not None:
+        collector = DataCollector.from_cache(key, cache)
+        if collector is None:
+            print(f"[ERROR] Run '{key}' not found in the run cache.")
+            return None
+        return collector.to_dataframe()
+    import pandas as pd
     try:
         data = pd.read_csv(filename)
         return data
@@ -13,23 +28,139 @@ def load_data(filename="simulation_results.csv"):
         return None
 
 class DataCollector:
-    """Collects simulation data each timestep."""
-    def __init__(self):
-        self.records = []
+    """Collects simulation data each timestep.
+
+    Daily rows live in preallocated integer arrays (sized to `horizon`,
+    doubled if a run goes longer). They can be filled by a census,
+    record(day, agents), or incrementally: start(counts) once, then
+    transition(src, dst, n) for every state change and record_day(day),
+    which is O(1). In incremental mode `track_incidence=True` adds daily
+    new infections (S→E) and the cumulative ever-infected count.
+    """
+    def __init__(self, horizon=None, track_incidence=False):
+        self.track_incidence = track_incidence
+        capacity = horizon or 256
+        self._n = 0
+        self._days = np.zeros(capacity, dtype=np.int64)
+        self._counts = np.zeros((capacity, len(STATES)), dtype=np.int64)
+        self._incidence = np.zeros(capacity, dtype=np.int64)
+        self._ever_infected = np.zeros(capacity, dtype=np.int64)
+        self._current = None  # running S, E, I, R, V counts in incremental mode
+        self._new_infections = 0
+        self._cumulative = 0
 
     def record(self, day, agents):
         states = [a.state for a in agents]
-        self.records.append({
-            "day": day,
-            "S": states.count('S'),
-            "E": states.count('E'),
-            "I": states.count('I'),
-            "R": states.count('R'),
-            "V": states.count('V')
-        })
+        self.record_counts(day, [states.count(s) for s in STATES])
+
+    def record_counts(self, day, counts):
+        """Record precomputed S, E, I, R, V counts."""
+        self._append(day, counts)
+
+    def start(self, counts, ever_infected=None):
+        """Switch to incremental mode with the current S, E, I, R, V counts.
+
+        ever_infected defaults to E + I + R.
+        """
+        self._current = [int(c) for c in counts]
+        if ever_infected is None:
+            ever_infected = sum(self._current[STATE_CODES[s]] for s in ('E', 'I', 'R'))
+        self._cumulative = int(ever_infected)
+        self._new_infections = 0
+
+    def transition(self, src, dst, n=1):
+        """Report `n` agents moving from state code `src` to `dst`."""
+        current = self._current
+        current[src] -= n
+        current[dst] += n
+        if src == _S and dst == _E:
+            self._new_infections += n
+            self._cumulative += n
+
+    @property
+    def current(self):
+        """Running S, E, I, R, V counts in incremental mode (None otherwise)."""
+        return None if self._current is None else list(self._current)
+
+    @property
+    def ever_infected(self):
+        """Running count of agents ever infected (incremental mode)."""
+        return self._cumulative
+
+    def record_day(self, day):
+        """Store the running counts as the row for `day` (incremental mode)."""
+        self._append(day, self._current)
+        self._new_infections = 0
+
+    def _append(self, day, counts):
+        if self._n == len(self._days):
+            self._grow()
+        n = self._n
+        self._days[n] = day
+        self._counts[n] = counts
+        self._incidence[n] = self._new_infections
+        self._ever_infected[n] = self._cumulative
+        self._n += 1
+
+    def _grow(self):
+        capacity = 2 * len(self._days)
+        for name in ("_days", "_counts", "_incidence", "_ever_infected"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def snapshot(self):
+        """Recorded rows and running totals, enough to resume recording later."""
+        n = self._n
+        return {"days": self._days[:n], "counts": self._counts[:n],
+                "incidence": self._incidence[:n], "ever_infected": self._ever_infected[:n],
+                "current": self._current, "cumulative": self._cumulative,
+                "new_infections": self._new_infections}
+
+    def load_snapshot(self, snapshot):
+        """Replace this collector's contents with a snapshot() (arrays are copied)."""
+        n = len(snapshot["days"])
+        while len(self._days) < n:
+            self._grow()
+        for name in ("days", "counts", "incidence", "ever_infected"):
+            getattr(self, f"_{name}")[:n] = snapshot[name]
+        self._n = n
+        self._current = None if snapshot["current"] is None else [int(c) for c in snapshot["current"]]
+        self._cumulative = int(snapshot["cumulative"])
+        self._new_infections = int(snapshot["new_infections"])
+
+    @property
+    def records(self):
+        """Daily rows as a list of dicts ("day", "S", ..., "V"[, "incidence", "ever_infected"])."""
+        columns = {"day": self._days[:self._n].tolist()}
+        for k, state in enumerate(STATES):
+            columns[state] = self._counts[:self._n, k].tolist()
+        if self.track_incidence:
+            columns["incidence"] = self._incidence[:self._n].tolist()
+            columns["ever_infected"] = self._ever_infected[:self._n].tolist()
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    def to_array(self, dtype="int32"):
+        """Daily counts as a compact (days, 5) array in S, E, I, R, V order."""
+        return self._counts[:self._n].astype(dtype)
+
+    @classmethod
+    def from_cache(cls, key, cache=None):
+        """The collector of a cached run (run_cache.default_cache() unless
+        `cache` is given), or None if `key` is not cached."""
+        from run_cache import default_cache
+        return (cache or default_cache()).get(key)
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.records)
 
     def to_csv(self, filename="simulation_results.csv"):
-        df = pd.DataFrame(self.records)
-        df.to_csv(filename, index=False)
+        rows = self.records
+        columns = ["day", *STATES] + (["incidence", "ever_infected"] if self.track_incidence else [])
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
         print(f"[INFO] Results saved to {filename}")
-
@@ -0,0 +1,92 @@
+# ensemble.py
+#
+# Replicate runner shared by run_multiple.py and sweep.py. Kept free of
+# plotting imports so pool workers start quickly.
+
+import collections
+import itertools
+import multiprocessing
+import numpy as np
+import config
+from simulation import Simulation
+
+def replicate_seed(seed, *key):
+    """Seed for the replicate identified by `key` (e.g. its run index).
+
+    Each replicate gets its own SeedSequence child, so the stream depends only
+    on (seed, key), not on how many runs or workers there are.
+    """
+    child = np.random.SeedSequence(seed, spawn_key=key)
+    return int.from_bytes(child.generate_state(4, np.uint32).tobytes(), "little")
+
+def run_replicate(task):
+    """Run one replicate (in a worker process) and return its (timesteps, 5) counts."""
+    seed, population, timesteps, sim_kwargs = task
+    engine = sim_kwargs.get("engine")
+    if engine == "tau":
+        from compartmental import simulate_tau
+        params = {k: v for k, v in sim_kwargs.items() if k != "engine"}
+        return simulate_tau(1, population, timesteps, seed=seed, **params)[0]
+    sim = Simulation(population=population, seed=seed, horizon=timesteps, **sim_kwargs)
+    sim.run(timesteps)  # fast-forwards once the epidemic has burned out
+    sim.close()
+    return sim.data_collector.to_array()[:timesteps]
+
+def imap_window(pool, func, tasks, window):
+    """Like pool.imap (results in task order) but with at most `window` tasks
+    submitted ahead, so a consumer that stops early wastes at most `window`
+    runs and `tasks` may be unbounded."""
+    tasks = iter(tasks)
+    pending = collections.deque(pool.apply_async(func, (task,)) for task in itertools.islice(tasks, window))
+    while pending:
+        result = pending.popleft().get()
+        pending.extend(pool.apply_async(func, (task,)) for task in itertools.islice(tasks, 1))
+        yield result
+
+def iter_replicates(n_runs, population, timesteps, n_workers=1, seed=None, tracker=None, **sim_kwargs):
+    """Yield each replicate's (timesteps, 5) count array in run-index order.
+
+    With n_workers > 1 the replicates run in a process pool; results still
+    arrive in run order, so aggregates match the sequential path exactly.
+    seed=None draws fresh OS entropy for the whole ensemble.
+    engine="tau" runs the tau-leaping compartmental surrogate instead
+    (see compartmental.py).
+
+    tracker: optional ensemble_stats.ConvergenceTracker. Every replicate is
+    added to it and iteration stops as soon as it has converged, with
+    n_runs as the cap. The decision is made in run order, so the number of
+    runs does not depend on n_workers either.
+    """
+    base = np.random.SeedSequence(seed).entropy
+    engine = sim_kwargs.get("engine")
+    if engine == "tau":
+        from compartmental import iter_replicates as iter_compartmental
+        params = {k: v for k, v in sim_kwargs.items() if k != "engine"}
+        results = iter_compartmental(n_runs, population, timesteps, method="tau",
+                                     n_workers=n_workers, seed=base, **params)
+        yield from _until_converged(results, tracker)
+        return
+    tasks = ((replicate_seed(base, r), population, timesteps, sim_kwargs) for r in range(n_runs))
+    if n_workers <= 1:
+        yield from _until_converged(map(run_replicate, tasks), tracker)
+        return
+    with multiprocessing.get_context().Pool(n_workers) as pool:
+        if tracker is None:
+            chunksize = max(1, n_runs // (4 * n_workers))
+            yield from pool.imap(run_replicate, tasks, chunksize=chunksize)
+        else:
+            # Keep only a few runs in flight so stopping wastes little work
+            yield from _until_converged(imap_window(pool, run_replicate, tasks, 2 * n_workers), tracker)
+
+def _until_converged(results, tracker):
+    for counts in results:
+        if tracker is not None:
+            tracker.add(counts)
+        yield counts
+        if tracker is not None and tracker.converged():
+            return
+
+def config_params():
+    """Simulation keyword arguments taken from config.py."""
+    return dict(beta=config.BETA, sigma=config.SIGMA, gamma=config.GAMMA, nu=config.NU,
+                mask_effect=config.MASK_EFFECT, vaccine_effect=config.VACC_EFFECT)
@@ -0,0 +1,202 @@
+# ensemble_stats.py
+
+from statistics import NormalDist
+import numpy as np
+from agent import STATES
+
+TARGETS = ("peak_I", "peak_day", "final_R", "I_band")
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile for every cell of an array (P² algorithm).
+
+    Jain & Chlamtac (1985): five markers per cell track the minimum, p/2, p,
+    (1+p)/2 quantiles and the maximum, adjusted with piecewise-parabolic
+    interpolation as observations arrive. Memory is constant in the number
+    of observations.
+    """
+
+    def __init__(self, p, shape):
+        self.p = p
+        self.count = 0
+        self._first = np.empty((5,) + tuple(shape))
+        self._dn = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0]).reshape((5,) + (1,) * len(shape))
+        self.q = None  # marker heights
+        self.n = None  # marker positions
+        self.desired = None  # desired marker positions
+
+    def add(self, x):
+        x = np.asarray(x, dtype=float)
+        if self.count < 5:
+            self._first[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                self.q = np.sort(self._first, axis=0)
+                self.n = np.broadcast_to(np.arange(5.0).reshape(self._dn.shape), self.q.shape).copy()
+                self.desired = np.broadcast_to(4 * self._dn, self.q.shape).copy()
+            return
+        self.count += 1
+        q, n = self.q, self.n
+
+        # Extend the extremes and bump positions of markers above the new value
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+        for i in range(1, 5):
+            n[i] += x < q[i] if i < 4 else 1
+        self.desired += self._dn
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            up = (d >= 1) & (n[i + 1] - n[i] > 1)
+            down = (d <= -1) & (n[i - 1] - n[i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            s = np.where(up, 1.0, -1.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                parabolic = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                neighbour_q = np.where(up, q[i + 1], q[i - 1])
+                neighbour_n = np.where(up, n[i + 1], n[i - 1])
+                linear = q[i] + s * (neighbour_q - q[i]) / (neighbour_n - n[i])
+            ok = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(ok, parabolic, linear), q[i])
+            n[i] = np.where(move, n[i] + s, n[i])
+
+    def value(self):
+        if self.count == 0:
+            raise ValueError("no observations")
+        if self.count < 5:
+            return np.quantile(self._first[:self.count], self.p, axis=0)
+        return self.q[2].copy()
+
+
+class EnsembleAggregator:
+    """Online summary of replicate count arrays of shape (timesteps, 5).
+
+    Keeps an exact running sum for the mean, Welford running variance and P²
+    quantile sketches, so memory does not grow with the number of
+    replicates. With `spill_path` (and
+    `n_runs`) every replicate is also written to a memory-mapped .npy file of
+    shape (runs, timesteps, 5) for later analysis.
+    """
+
+    def __init__(self, timesteps, quantiles=(0.05, 0.5, 0.95), spill_path=None, n_runs=None):
+        shape = (timesteps, len(STATES))
+        self.timesteps = timesteps
+        self.count = 0
+        self._sum = np.zeros(shape)
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self.quantiles = tuple(quantiles)
+        self._sketches = [P2Quantile(p, shape) for p in self.quantiles]
+        self.spill = None
+        if spill_path is not None:
+            if n_runs is None:
+                raise ValueError("spill_path needs n_runs to size the memory map")
+            self.spill = np.lib.format.open_memmap(spill_path, mode="w+", dtype=np.int32,
+                                                   shape=(n_runs,) + shape)
+
+    def add(self, counts):
+        """Consume one replicate's (timesteps, 5) count array."""
+        counts = np.asarray(counts)
+        if self.spill is not None:
+            self.spill[self.count] = counts
+        self.count += 1
+        self._sum += counts
+        delta = counts - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (counts - self._mean)
+        for sketch in self._sketches:
+            sketch.add(counts)
+
+    @property
+    def mean(self):
+        return self._sum / max(self.count, 1)
+
+    @property
+    def std(self):
+        """Population standard deviation (ddof=0, as np.std)."""
+        return np.sqrt(self._m2 / max(self.count, 1))
+
+    def quantile(self, p):
+        return self._sketches[self.quantiles.index(p)].value()
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.flush()
+
+    def summary_columns(self):
+        """Column name -> per-day values: means plus e.g. I_q05 / I_q50 / I_q95."""
+        mean = self.mean
+        columns = {state: mean[:, k] for k, state in enumerate(STATES)}
+        for p, sketch in zip(self.quantiles, self._sketches):
+            values = sketch.value()
+            for k, state in enumerate(STATES):
+                columns[f"{state}_q{round(p * 100):02d}"] = values[:, k]
+        return columns
+
+
+class ConvergenceTracker:
+    """Confidence-interval half-widths of ensemble targets, for stopping an
+    ensemble once its estimates are precise enough.
+
+    Targets: "peak_I", "peak_day" and "final_R" are the replicate means of
+    those scalars; "I_band" is the mean infected curve, judged by its widest
+    per-day interval. With relative=True a target's half-width is divided by
+    its mean ("I_band": by the peak of the mean curve). `tol` is one number
+    or a {target: tol} dict (which then also picks the targets); converged() needs at least `min_runs` runs and
+    every target within its tolerance.
+    """
+
+    def __init__(self, timesteps, tol=0.05, targets=TARGETS, min_runs=10, confidence=0.95,
+                 relative=True):
+        if isinstance(tol, dict):
+            targets = tuple(tol)
+        unknown = set(targets) - set(TARGETS)
+        if unknown:
+            raise ValueError(f"Unknown targets {sorted(unknown)}; expected some of {TARGETS}")
+        if min_runs < 2:
+            raise ValueError("min_runs must be at least 2 to estimate a variance")
+        self.targets = tuple(targets)
+        self.tol = tol if isinstance(tol, dict) else {t: tol for t in self.targets}
+        self.min_runs = min_runs
+        self.relative = relative
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.count = 0
+        shape = (len(TARGETS) - 1 + timesteps,)  # three scalars, then the I curve
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def add(self, counts):
+        """Consume one replicate's (timesteps, 5) count array."""
+        counts = np.asarray(counts)
+        infected = counts[:, STATES.index('I')]
+        x = np.concatenate([[infected.max(), infected.argmax() + 1, counts[-1, STATES.index('R')]],
+                            infected])
+        self.count += 1
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+
+    def half_widths(self):
+        """Target -> CI half-width of its mean (relative if self.relative)."""
+        if self.count < 2:
+            return {t: np.inf for t in self.targets}
+        hw = self.z * np.sqrt(self._m2 / (self.count - 1) / self.count)
+        scale = np.abs(self._mean)
+        values = dict(zip(TARGETS[:3], zip(hw[:3], scale[:3])))
+        values["I_band"] = (hw[3:].max(), scale[3:].max())
+        out = {}
+        for t in self.targets:
+            width, mean = values[t]
+            if self.relative:
+                width = width / mean if mean else (0.0 if width == 0 else np.inf)
+            out[t] = float(width)
+        return out
+
+    def converged(self):
+        if self.count < self.min_runs:
+            return False
+        return all(w <= self.tol[t] for t, w in self.half_widths().items())
@@ -1,17 +1,104 @@
 # environment.py
 
 import random
+from collections.abc import Sequence
+
+TIMER_DTYPE = "uint32"  # compact infection_timer (a due day)
+TIMER_LIMIT = 2**32
 
 class Environment:
-    """Holds population and manages random agent creation."""
-    def __init__(self, population_size, mask_rate=0.6, vaccine_rate=0.4):
-        from agent import Agent  # moved here to avoid circular import issue
-        self.population = []
-        for i in range(population_size):
-            mask = random.random() < mask_rate
-            vaccinated = random.random() < vaccine_rate
-            self.population.append(Agent(i, mask, vaccinated))
+    """Holds population and manages random agent creation.
+
+    compact=False keeps the original list of Agent objects. compact=True stores
+    the population as one array per attribute (state as uint8 codes, flags as
+    bool, timers as uint32) built in bulk, and `population` becomes a sequence
+    of AgentView objects onto those arrays. Scheduled due days must be below
+    TIMER_LIMIT (2**32); book() raises ValueError otherwise.
+    """
+    def __init__(self, population_size, mask_rate=0.6, vaccine_rate=0.4, rng=random, compact=False):
+        self.compact = compact
+        if compact:
+            self._build_arrays(population_size, mask_rate, vaccine_rate, rng)
+            self.population = CompactPopulation(self)
+        else:
+            from agent import Agent  # moved here to avoid circular import issue
+            self.population = []
+            for i in range(population_size):
+                mask = rng.random() < mask_rate
+                vaccinated = rng.random() < vaccine_rate
+                self.population.append(Agent(i, mask, vaccinated))
+
+    def _build_arrays(self, population_size, mask_rate, vaccine_rate, rng):
+        import numpy as np
+        if not isinstance(rng, np.random.Generator):
+            # Derive a NumPy stream from the caller's random.Random / module
+            rng = np.random.default_rng(rng.getrandbits(64))
+        self.state = np.zeros(population_size, dtype=np.uint8)  # every agent starts in S
+        self.mask = rng.random(population_size) < mask_rate
+        self.vaccinated = rng.random(population_size) < vaccine_rate
+        self.infection_timer = np.zeros(population_size, dtype=TIMER_DTYPE)
+        self.ever_infected = np.zeros(population_size, dtype=bool)
+
+
+    ARRAYS = ("state", "mask", "vaccinated", "infection_timer", "ever_infected")
+
+    def to_arrays(self):
+        """Population attributes as arrays (state as uint8 codes), for either backend."""
+        if self.compact:
+            return {name: getattr(self, name) for name in self.ARRAYS}
+        import numpy as np
+        from agent import STATE_CODES
+        pop = self.population
+        return {
+            "state": np.fromiter((STATE_CODES[a.state] for a in pop), np.uint8, len(pop)),
+            "mask": np.fromiter((a.mask for a in pop), bool, len(pop)),
+            "vaccinated": np.fromiter((a.vaccinated for a in pop), bool, len(pop)),
+            "infection_timer": np.fromiter((a.infection_timer for a in pop), TIMER_DTYPE, len(pop)),
+            "ever_infected": np.fromiter((a.ever_infected for a in pop), bool, len(pop)),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, compact=True):
+        """Rebuild an Environment from to_arrays() output (e.g. a checkpoint)."""
+        env = cls.__new__(cls)
+        env.compact = compact
+        if compact:
+            for name in cls.ARRAYS:
+                setattr(env, name, arrays[name])
+            env.population = CompactPopulation(env)
+        else:
+            from agent import Agent, STATES
+            env.population = []
+            columns = [arrays[name].tolist() for name in cls.ARRAYS]
+            for i, (state, mask, vaccinated, timer, ever) in enumerate(zip(*columns)):
+                agent = Agent(i, mask, vaccinated)
+                agent.state = STATES[state]
+                agent.infection_timer = timer
+                agent.ever_infected = ever
+                env.population.append(agent)
+        return env
+
+
+class CompactPopulation(Sequence):
+    """List-like access to a compact Environment; items are AgentView objects."""
 
+    def __init__(self, env):
+        self._env = env
 
+    def __len__(self):
+        return len(self._env.state)
 
+    def __getitem__(self, index):
+        from agent import AgentView
+        if isinstance(index, slice):
+            return [AgentView(self._env, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("population index out of range")
+        return AgentView(self._env, index)
 
+    def __iter__(self):
+        from agent import AgentView
+        env = self._env
+        return (AgentView(env, i) for i in range(len(env.state)))
@@ -0,0 +1,102 @@
+# event_log.py
+#
+# Opt-in transmission event log. Records are fixed-size binary rows
+# (day, infector id, infectee id, p) appended to a file after an 8-byte
+# magic header, buffered in a NumPy structured array between writes.
+
+import os
+import numpy as np
+
+MAGIC = b"SEIRVTX1"
+RECORD_DTYPE = np.dtype([("day", "<i4"), ("infector", "<i8"), ("infectee", "<i8"), ("p", "<f4")])
+
+
+class TransmissionLog:
+    """Buffered, append-only writer for transmission events."""
+
+    def __init__(self, path, buffer_size=65536):
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new_file:
+            self._file.write(MAGIC)
+        else:
+            # Drop a partial last record (e.g. from a crashed run) so that
+            # appended rows stay aligned
+            size = os.path.getsize(path)
+            partial = (size - len(MAGIC)) % RECORD_DTYPE.itemsize
+            if partial:
+                self._file.truncate(size - partial)
+        self._buffer = np.empty(buffer_size, dtype=RECORD_DTYPE)
+        self._n = 0
+
+    def record(self, day, infector, infectee, p):
+        """Append one event (object engine)."""
+        if self._n == len(self._buffer):
+            self.flush()
+        self._buffer[self._n] = (day, infector, infectee, p)
+        self._n += 1
+
+    def record_batch(self, day, infectors, infectees, p):
+        """Append a batch of events from one day (numpy engine)."""
+        rows = np.empty(len(infectees), dtype=RECORD_DTYPE)
+        rows["day"] = day
+        rows["infector"] = infectors
+        rows["infectee"] = infectees
+        rows["p"] = p
+        if self._n + len(rows) > len(self._buffer):
+            self.flush()
+            if len(rows) > len(self._buffer):
+                self._file.write(rows.tobytes())
+                return
+        self._buffer[self._n:self._n + len(rows)] = rows
+        self._n += len(rows)
+
+    def flush(self):
+        if self._n:
+            self._file.write(self._buffer[:self._n].tobytes())
+            self._n = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_events(path):
+    """Memory-map a transmission log as a structured array with fields
+    day, infector, infectee, p.
+
+    A partial last record (a file cut off mid-write) is reported and left out.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a transmission log")
+    n, partial = divmod(os.path.getsize(path) - len(MAGIC), RECORD_DTYPE.itemsize)
+    if partial:
+        print(f"[ERROR] {path} ends with a partial record ({partial} bytes); ignoring it")
+    if n == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=len(MAGIC), shape=(n,))
+
+
+def read_transmissions(path):
+    """Load a transmission log into a DataFrame (day, infector, infectee, p)."""
+    import pandas as pd
+    return pd.DataFrame(np.asarray(read_events(path)))
+
+
+def transmission_tree(path):
+    """Who-infected-whom: dict of infector id -> list of infectee ids."""
+    tree = {}
+    events = read_events(path)
+    for infector, infectee in zip(events["infector"].tolist(), events["infectee"].tolist()):
+        tree.setdefault(infector, []).append(infectee)
+    return tree
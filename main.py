@@ -1,24 +1,34 @@
 # main.py
 from simulation import Simulation
 from visualization import plot_epidemic_curve
+from agent import STATES
 import config
 
 if __name__ == "__main__":
-    sim = Simulation(population=1000,
-                     beta=config.BETA,
-                     sigma=config.SIGMA,
-                     gamma=config.GAMMA,
-                     nu=config.NU,
-                     mask_effect=config.MASK_EFFECT,
-                     vaccine_effect=config.VACC_EFFECT)
+    params = dict(population=1000,
+                  beta=config.BETA,
+                  sigma=config.SIGMA,
+                  gamma=config.GAMMA,
+                  nu=config.NU,
+                  mask_effect=config.MASK_EFFECT,
+                  vaccine_effect=config.VACC_EFFECT)
 
-    for _ in range(200):
-        sim.step()
+    if config.SEED is not None:
+        # Reproducible run: reuse it from the run cache when it exists. The
+        # plot reads the cached run; the CSV is only written on request.
+        from run_cache import default_cache
+        key, collector = default_cache().run(200, seed=config.SEED, **params)
+        print(f"[INFO] Run key: {key}")
+        write_csv = config.WRITE_CSV
+    else:
+        key = None
+        sim = Simulation(**params)
+        sim.run(200)
+        collector = sim.data_collector
+        write_csv = True
 
-    agents = sim.environment.population
-    total_recovered = sum(1 for agent in agents if agent.state == 'R')
+    total_recovered = collector.to_array()[-1][STATES.index('R')]
     print(f"Total recovered: {total_recovered}")
-    sim.data_collector.to_csv("simulation_results.csv")
-    plot_epidemic_curve("simulation_results.csv")
-
-
+    if write_csv:
+        collector.to_csv("simulation_results.csv")
+    plot_epidemic_curve("simulation_results.csv", key=key)
@@ -0,0 +1,159 @@
+# numpy_engine.py
+
+import numpy as np
+from agent import STATES, STATE_CODES
+from environment import TIMER_LIMIT
+from profiler import CONTACTS, TRANSMISSION, PROGRESSION, VACCINATION, CONTACTS_DRAWN, TRIALS
+
+S, E, I, R, V = (STATE_CODES[s] for s in STATES)
+CONTACTS_PER_DAY = 10
+
+
+class NumpyEngine:
+    """Array-backed SEIRV engine running on a compact Environment's arrays.
+
+    Every phase of a day is a batched NumPy operation, so the per-day cost is a
+    handful of vectorised passes instead of a Python loop over Agent objects.
+    """
+
+    def __init__(self, environment, rng, collector):
+        self.rng = rng
+        self.collector = collector
+        self.state = environment.state
+        self.mask = environment.mask
+        self.vaccinated = environment.vaccinated
+        self.infection_timer = environment.infection_timer
+        self.ever_infected = environment.ever_infected
+
+    def counts(self):
+        """Census of the S, E, I, R, V counts as an int64 array."""
+        return np.bincount(self.state, minlength=len(STATES))
+
+    def _move(self, idx, src, dst):
+        """Move agents `idx` (all currently in `src`) to `dst` and report it."""
+        self.state[idx] = dst
+        self.collector.transition(src, dst, idx.size)
+
+    def transmit(self, sim, infectious):
+        """Contacts of the infectious agents, drawn in bulk: up to
+        CONTACTS_PER_DAY random agents each, or all network neighbours when
+        sim.network is set. Every susceptible contact gets a Bernoulli trial."""
+        state = self.state
+        prof = sim.profiler
+        if infectious.size == 0:
+            return
+        if sim.network is not None:
+            infectors, contacts = sim.network.gather(infectious)
+        else:
+            n = state.size
+            k = min(CONTACTS_PER_DAY, n)
+            # Contacts are drawn with replacement; for large N this is
+            # indistinguishable from random.sample and avoids a per-agent loop.
+            infectors = np.repeat(infectious, k)
+            contacts = self.rng.integers(0, n, size=infectors.size)
+        if prof is not None:
+            prof.count(CONTACTS_DRAWN, contacts.size)
+            prof.lap(CONTACTS)
+        trials = np.flatnonzero(state[contacts] == S)
+        infectors, contacts = infectors[trials], contacts[trials]
+        e_m = np.where(self.mask[infectors] | self.mask[contacts], sim.mask_effect, 0.0)
+        e_v = np.where(self.vaccinated[contacts], sim.vaccine_effect, 0.0)
+        p = sim.beta * (1 - e_m) * (1 - e_v)
+        hits = np.flatnonzero(self.rng.random(contacts.size) < p)
+        # A susceptible hit by several infectors is exposed once
+        exposed, first = np.unique(contacts[hits], return_index=True)
+        self._move(exposed, S, E)
+        self.ever_infected[exposed] = True
+        if sim.event_log is not None:
+            first = hits[first]
+            sim.event_log.record_batch(sim.day, infectors[first], exposed, p[first])
+        if sim.progression == "scheduled":
+            self.schedule(sim, exposed, E)
+        if prof is not None:
+            prof.count(TRIALS, contacts.size)
+
+    def schedule(self, sim, ids, state, start=None):
+        """Batched version of Simulation._schedule for agents entering E or I."""
+        if ids.size == 0:
+            return
+        start = sim.day if start is None else start
+        if state == E:
+            due = start + np.asarray(sim.incubation(self.rng, ids.size)) - 1
+        else:
+            due = start + np.asarray(sim.infectious_period(self.rng, ids.size))
+        self.book(sim, ids, due)
+
+    def book(self, sim, ids, due):
+        """Record due days in infection_timer and add the agents to the calendar."""
+        if due.size and due.max() >= TIMER_LIMIT:
+            raise ValueError(f"Due day {due.max()} does not fit infection_timer (limit {TIMER_LIMIT})")
+        self.infection_timer[ids] = due
+        order = np.argsort(due, kind="stable")
+        days, starts = np.unique(due[order], return_index=True)
+        for day, chunk in zip(days.tolist(), np.split(ids[order], starts[1:])):
+            sim._calendar[day].append(chunk)
+
+    def progress(self, sim, infectious):
+        """E→I and I→R transitions with one Bernoulli draw per E/I agent."""
+        exposed = np.flatnonzero(self.state == E)
+        self._move(exposed[self.rng.random(exposed.size) < sim.sigma], E, I)
+        self._move(infectious[self.rng.random(infectious.size) < sim.gamma], I, R)
+
+    def process_due(self, sim):
+        """E→I and I→R transitions for the agents scheduled for today."""
+        chunks = sim._calendar.pop(sim.day, None)
+        if not chunks:
+            return
+        due = np.concatenate(chunks)
+        due = due[self.infection_timer[due] == sim.day]  # drop superseded bookings
+        state = self.state[due]
+        to_infectious = due[state == E]
+        self._move(due[state == I], I, R)
+        self._move(to_infectious, E, I)
+        self.schedule(sim, to_infectious, I)
+
+    def vaccinate(self, sim):
+        """S→V: draw the number of newly vaccinated from a binomial and pick
+        them without replacement, which has the same distribution as one
+        Bernoulli(nu) draw per susceptible."""
+        susceptible = np.flatnonzero(self.state == S)
+        k = self.rng.binomial(susceptible.size, sim.nu)
+        self._move(susceptible[self.rng.choice(susceptible.size, k, replace=False)], S, V)
+
+    def fast_forward(self, sim, days):
+        """Advance `days` days with no agent in E or I, where only S→V
+        remains: per-day binomial counts over the shrinking susceptible pool,
+        then one draw without replacement for all of them, so the population
+        is scanned once instead of once per day."""
+        susceptible = np.flatnonzero(self.state == S)
+        remaining = susceptible.size
+        per_day = []
+        for _ in range(days):
+            k = int(self.rng.binomial(remaining, sim.nu))
+            per_day.append(k)
+            remaining -= k
+        chosen = susceptible[self.rng.choice(susceptible.size, sum(per_day), replace=False)]
+        start = 0
+        for k in per_day:
+            sim.day += 1
+            self._move(chosen[start:start + k], S, V)
+            start += k
+            sim.data_collector.record_day(sim.day)
+
+    def step(self, sim):
+        # The infectious set is fixed for the whole infection phase; agents
+        # exposed today only become infectious during progression.
+        prof = sim.profiler
+        infectious = np.flatnonzero(self.state == I)
+        self.transmit(sim, infectious)
+        if prof is not None:
+            prof.lap(TRANSMISSION)
+        if sim.progression == "scheduled":
+            self.process_due(sim)
+        else:
+            self.progress(sim, infectious)
+        if prof is not None:
+            prof.lap(PROGRESSION)
+        self.vaccinate(sim)
+        if prof is not None:
+            prof.lap(VACCINATION)
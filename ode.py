@@ -0,0 +1,174 @@
+# ode.py
+#
+# Deterministic SEIRV ODE shared by validation.py, run_multiple.py and the
+# sweep / calibration tools. solve_seirv integrates a whole batch of parameter
+# sets at once with a NumPy right-hand side and memoises each solution.
+
+import hashlib
+import os
+from collections import OrderedDict
+import numpy as np
+
+
+def seirv_ode(y, t, beta, sigma, gamma, nu):
+    """Right-hand side in scipy.integrate.odeint form for a single parameter set."""
+    S, E, I, R, V = y
+    N = S + E + I + R + V
+    if N <= 0:
+        # avoid division by zero
+        return [0, 0, 0, 0, 0]
+    dSdt = -beta * S * I / N - nu * S
+    dEdt = beta * S * I / N - sigma * E
+    dIdt = sigma * E - gamma * I
+    dRdt = gamma * I
+    dVdt = nu * S
+    return [dSdt, dEdt, dIdt, dRdt, dVdt]
+
+
+def seirv_rhs(y, beta, sigma, gamma, nu):
+    """Vectorised right-hand side: y is (5, batch), parameters are (batch,)."""
+    S, E, I = y[0], y[1], y[2]
+    N = y.sum(axis=0)
+    infection = np.divide(beta * S * I, N, out=np.zeros_like(S), where=N > 0)
+    vaccination = nu * S
+    progression = sigma * E
+    recovery = gamma * I
+    return np.stack([-infection - vaccination,
+                     infection - progression,
+                     progression - recovery,
+                     recovery,
+                     vaccination])
+
+
+def _integrate_rk4(y0, t, params, substeps):
+    """Classic RK4 over the batch with `substeps` equal steps between grid points."""
+    out = np.empty((len(t), 5, y0.shape[0]))
+    y = y0.T.copy()
+    out[0] = y
+    for k in range(1, len(t)):
+        h = (t[k] - t[k - 1]) / substeps
+        for _ in range(substeps):
+            k1 = seirv_rhs(y, *params)
+            k2 = seirv_rhs(y + 0.5 * h * k1, *params)
+            k3 = seirv_rhs(y + 0.5 * h * k2, *params)
+            k4 = seirv_rhs(y + h * k3, *params)
+            y = y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        out[k] = y
+    return out.transpose(2, 0, 1)
+
+
+def _integrate_odeint(y0, t, params):
+    from scipy.integrate import odeint
+    return np.stack([odeint(seirv_ode, y0[b], t, args=tuple(p[b] for p in params))
+                     for b in range(y0.shape[0])])
+
+
+class ODECache:
+    """LRU cache of ODE solutions keyed by parameters, initial state and time
+    grid, with an optional on-disk tier of .npy files in `disk_dir`."""
+
+    def __init__(self, maxsize=4096, disk_dir=None):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self._memory = OrderedDict()
+        self.hits = self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(row, t, method):
+        digest = hashlib.sha1(np.ascontiguousarray(row, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(t, dtype=np.float64).tobytes())
+        digest.update(method.encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+        if self.disk_dir:
+            path = os.path.join(self.disk_dir, f"{key}.npy")
+            if os.path.exists(path):
+                self.hits += 1
+                value = np.load(path)
+                self._remember(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.disk_dir:
+            tmp = os.path.join(self.disk_dir, f".{key}.{os.getpid()}.npy")
+            np.save(tmp, value)
+            os.replace(tmp, os.path.join(self.disk_dir, f"{key}.npy"))
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        self._memory.clear()
+
+
+_cache = ODECache()
+
+
+def configure_cache(maxsize=4096, disk_dir=None):
+    """Replace the module-level cache used by solve_seirv."""
+    global _cache
+    _cache = ODECache(maxsize, disk_dir)
+    return _cache
+
+
+def solve_seirv(t, beta, sigma, gamma, nu, N=1000, E0=0, I0=1, R0=0, V0=0,
+                method="rk4", substeps=4, cache=True):
+    """Solve the SEIRV ODE on time grid `t` for one or many parameter sets.
+
+    Any of beta, sigma, gamma, nu, N, E0, I0, R0, V0 may be an array; they are
+    broadcast to a common batch shape (B,) and the batch is integrated in one
+    vectorised call. S0 = N - E0 - I0 - R0 - V0. Returns (len(t), 5) columns
+    S, E, I, R, V for scalar input, else (B, len(t), 5).
+
+    method="rk4" is a fixed-step RK4 with `substeps` steps per grid interval;
+    method="odeint" loops scipy's odeint over the batch (reference solution).
+    Each parameter set's solution is cached (see configure_cache); cached rows
+    are shared between batches.
+    """
+    t = np.asarray(t, dtype=float)
+    columns = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                    for v in (beta, sigma, gamma, nu, N, E0, I0, R0, V0)))
+    rows = np.stack(columns, axis=1)  # (B, 9)
+    scalar = all(np.ndim(v) == 0 for v in (beta, sigma, gamma, nu, N, E0, I0, R0, V0))
+
+    tag = method if method == "odeint" else f"{method}:{substeps}"
+    keys = [ODECache.key(row, t, tag) for row in rows] if cache else [None] * len(rows)
+    out = np.empty((len(rows), len(t), 5))
+    missing = []
+    for b, key in enumerate(keys):
+        hit = _cache.get(key) if cache else None
+        if hit is None:
+            missing.append(b)
+        else:
+            out[b] = hit
+
+    if missing:
+        sub = rows[missing]
+        N_, E0_, I0_, R0_, V0_ = sub[:, 4:].T
+        y0 = np.stack([N_ - E0_ - I0_ - R0_ - V0_, E0_, I0_, R0_, V0_], axis=1)
+        params = tuple(sub[:, j] for j in range(4))
+        if method == "rk4":
+            solved = _integrate_rk4(y0, t, params, substeps)
+        elif method == "odeint":
+            solved = _integrate_odeint(y0, t, params)
+        else:
+            raise ValueError(f"Unknown method '{method}'; expected 'rk4' or 'odeint'")
+        out[missing] = solved
+        if cache:
+            for b, solution in zip(missing, solved):
+                _cache.put(keys[b], solution.copy())
+
+    return out[0] if scalar else out
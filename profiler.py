@@ -0,0 +1,199 @@
+# profiler.py
+#
+# Per-phase instrumentation for Simulation.step. A StepProfiler passed as
+# Simulation(profiler=...) accumulates the wall time of every phase of every
+# day, plus per-day counters, in preallocated arrays; with no profiler the
+# step pays one `is None` check per phase. Hooks attach extra tooling
+# (cProfile, tracemalloc, custom exporters) to day and phase boundaries.
+
+import csv
+import time
+import numpy as np
+from agent import STATES
+
+PHASES = ("contacts", "transmission", "progression", "vaccination", "record")
+CONTACTS, TRANSMISSION, PROGRESSION, VACCINATION, RECORD = range(len(PHASES))
+FLOWS = ("S_E", "E_I", "I_R", "S_V")
+COUNTERS = ("contacts_drawn", "trials") + FLOWS
+CONTACTS_DRAWN, TRIALS = range(2)
+_S, _E, _R, _V = (STATES.index(s) for s in "SERV")
+
+
+class ProfilerHook:
+    """Base class for profiler hooks; override the callbacks you need."""
+
+    def start_day(self, profiler, day):
+        pass
+
+    def end_phase(self, profiler, day, phase, seconds):
+        pass
+
+    def end_day(self, profiler, day):
+        pass
+
+    def close(self, profiler):
+        pass
+
+
+class StepProfiler:
+    """Accumulates per-day phase timings and counters for a Simulation.
+
+    Phases are PHASES; the object engine draws contacts inside its
+    transmission loop, so its contact time is reported under "transmission".
+    Counters are contacts drawn, Bernoulli trials evaluated and the day's
+    S→E, E→I, I→R and S→V transitions (from the DataCollector's running
+    counts). Storage is sized to `horizon` days and doubles when full.
+    """
+
+    def __init__(self, horizon=None, hooks=()):
+        capacity = horizon or 256
+        self.hooks = list(hooks)
+        self._n = 0
+        self._days = np.zeros(capacity, dtype=np.int64)
+        self._wall = np.zeros(capacity)
+        self._timings = np.zeros((capacity, len(PHASES)))
+        self._counters = np.zeros((capacity, len(COUNTERS)), dtype=np.int64)
+        self._last = 0.0
+        self._day = None
+        self._before = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def start_day(self, day, counts=None):
+        """Open the row for `day`; `counts` are the S, E, I, R, V counts before the step."""
+        if self._n == len(self._days):
+            self._grow()
+        n = self._n
+        self._day = day
+        self._days[n] = day
+        self._wall[n] = time.time()
+        self._before = counts
+        for hook in self.hooks:
+            hook.start_day(self, day)
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the previous lap (or start_day) to `phase`."""
+        now = time.perf_counter()
+        seconds = now - self._last
+        self._timings[self._n, phase] += seconds
+        if self.hooks:
+            for hook in self.hooks:
+                hook.end_phase(self, self._day, PHASES[phase], seconds)
+            now = time.perf_counter()  # hook time is not charged to the next phase
+        self._last = now
+
+    def count(self, counter, n):
+        self._counters[self._n, counter] += n
+
+    def end_day(self, counts=None):
+        """Close the row; `counts` are the S, E, I, R, V counts after the step."""
+        if self._before is not None and counts is not None:
+            delta = [after - before for before, after in zip(self._before, counts)]
+            s_v = delta[_V]
+            s_e = -delta[_S] - s_v
+            self._counters[self._n, len(COUNTERS) - len(FLOWS):] = (s_e, s_e - delta[_E], delta[_R], s_v)
+        self._n += 1
+        for hook in self.hooks:
+            hook.end_day(self, self._day)
+
+    def _grow(self):
+        capacity = 2 * len(self._days)
+        for name in ("_days", "_wall", "_timings", "_counters"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    @property
+    def days(self):
+        return self._days[:self._n]
+
+    @property
+    def timings(self):
+        """(days, len(PHASES)) seconds per phase."""
+        return self._timings[:self._n]
+
+    @property
+    def counters(self):
+        """(days, len(COUNTERS)) per-day counters."""
+        return self._counters[:self._n]
+
+    def summary(self):
+        """Total seconds and share of step time per phase."""
+        totals = self.timings.sum(axis=0)
+        overall = totals.sum() or 1.0
+        return {phase: {"seconds": float(t), "share": float(t / overall)}
+                for phase, t in zip(PHASES, totals)}
+
+    def to_csv(self, path="step_profile.csv"):
+        """One row per day: wall-clock start (comparable with resource_usage.csv
+        timestamps), seconds per phase and the counters."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["day", "timestamp", *(f"{p}_s" for p in PHASES), *COUNTERS])
+            for day, wall, timing, counter in zip(self.days.tolist(), self._wall[:self._n].tolist(),
+                                                  self.timings.tolist(), self.counters.tolist()):
+                writer.writerow([day, f"{wall:.3f}", *(f"{t:.6f}" for t in timing), *counter])
+        print(f"[INFO] Step profile saved to {path}")
+
+    def close(self):
+        for hook in self.hooks:
+            hook.close(self)
+
+
+class CProfileHook(ProfilerHook):
+    """Runs cProfile over whole steps; stats() returns a pstats.Stats and
+    close() dumps them to `path` if given."""
+
+    def __init__(self, path=None):
+        import cProfile
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def start_day(self, profiler, day):
+        self.profile.enable()
+
+    def end_day(self, profiler, day):
+        self.profile.disable()
+
+    def stats(self):
+        import pstats
+        return pstats.Stats(self.profile)
+
+    def close(self, profiler):
+        if self.path:
+            self.profile.dump_stats(self.path)
+            print(f"[INFO] cProfile stats saved to {self.path}")
+
+
+class TracemallocHook(ProfilerHook):
+    """Takes a tracemalloc snapshot every `every` days and keeps
+    (day, traced bytes, peak bytes, top `top` allocation sites)."""
+
+    def __init__(self, every=10, top=10):
+        self.every = every
+        self.top = top
+        self.snapshots = []
+        self._started = False
+
+    def start_day(self, profiler, day):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+    def end_day(self, profiler, day):
+        import tracemalloc
+        if day % self.every:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:self.top]
+        self.snapshots.append((day, current, peak, stats))
+
+    def close(self, profiler):
+        import tracemalloc
+        if self._started:
+            tracemalloc.stop()
@@ -0,0 +1,227 @@
+# render.py
+#
+# Headless rendering for batch nodes. Figures are drawn on matplotlib's Agg
+# canvas directly (pyplot is never imported, so no GUI backend or event loop
+# is started), long series are decimated to the output pixel width, and
+# animations redraw only the changing artists over a cached background
+# before the raw frames are handed to Pillow (GIF) or ffmpeg (MP4).
+
+import math
+import multiprocessing
+import os
+import shutil
+import subprocess
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from agent import STATES
+
+SERIES = (("S", "Susceptible", "tab:blue", 1.5), ("E", "Exposed", "tab:orange", 1.5),
+          ("I", "Infected", "tab:red", 2.0), ("R", "Recovered", "tab:green", 1.5),
+          ("V", "Vaccinated", "tab:purple", 1.5))
+
+
+def decimate(x, y, width):
+    """Reduce (x, y) to at most ~2 * width points for a plot `width` pixels wide.
+
+    Each of `width` buckets keeps its minimum and maximum sample (in order),
+    so peaks survive; the first and last points are always kept.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(x)
+    if width is None or n <= 2 * width:
+        return x, y
+    size = math.ceil(n / width)
+    rows = math.ceil(n / size)
+    padded = np.concatenate([y, np.full(rows * size - n, y[-1])]).reshape(rows, size)
+    base = np.arange(rows) * size
+    picks = np.sort(np.stack([base + padded.argmin(axis=1), base + padded.argmax(axis=1)], axis=1), axis=1)
+    idx = np.concatenate([[0], np.minimum(picks.ravel(), n - 1), [n - 1]])
+    idx = idx[np.concatenate([[True], idx[1:] != idx[:-1]])]
+    return x[idx], y[idx]
+
+
+def load_counts(source):
+    """(days, counts) from a results CSV path, a DataFrame with day / S..V
+    columns, or a (days, 5) counts array (days numbered from 1)."""
+    if isinstance(source, str):
+        import pandas as pd
+        source = pd.read_csv(source)
+    if hasattr(source, "columns"):
+        return source["day"].to_numpy(), source[list(STATES)].to_numpy()
+    counts = np.asarray(source)
+    return np.arange(1, len(counts) + 1), counts
+
+
+def _figure(width, height, dpi):
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    return fig, canvas
+
+
+def _axes(fig, days, counts, title):
+    ax = fig.add_subplot()
+    ax.set_xlim(days.min(), days.max())
+    ax.set_ylim(0, counts.max() * 1.1 or 1)
+    ax.set_xlabel("Day")
+    ax.set_ylabel("Population")
+    ax.set_title(title)
+    return ax
+
+
+def _plot_width(fig, ax):
+    return max(1, int(round(ax.get_position().width * fig.bbox.width)))
+
+
+def _load_days(source):
+    """load_counts, rejecting a series with no days (e.g. an empty sweep point)."""
+    days, counts = load_counts(source)
+    if len(days) == 0:
+        raise ValueError(f"Nothing to render: {source if isinstance(source, str) else 'series'} has no days")
+    return days, counts
+
+
+def render_curve(source, out="epidemic_curve.png", width=800, height=400, dpi=100,
+                 title="COVID-19 Simulation (SEIRV)"):
+    """Write the S, E, I, R, V curves of one run to `out` (format from the
+    extension: .png, .svg, .pdf, ...) without a GUI. Raises ValueError for a
+    series with no days."""
+    days, counts = _load_days(source)
+    fig, canvas = _figure(width, height, dpi)
+    ax = _axes(fig, days, counts, title)
+    px = _plot_width(fig, ax)
+    for k, (state, label, color, lw) in enumerate(SERIES):
+        ax.plot(*decimate(days, counts[:, k], px), color=color, label=label, linewidth=lw)
+    ax.legend(loc="upper right")
+    fig.tight_layout()
+    fig.savefig(out)
+    return out
+
+
+class _FrameSink:
+    """Receives RGBA frames and writes them as a GIF (Pillow) or MP4 (ffmpeg)."""
+
+    def __init__(self, out, width, height, fps):
+        self.out = out
+        self.fps = fps
+        ext = os.path.splitext(out)[1].lower()
+        if ext == ".gif":
+            self._frames = []
+            self._proc = None
+        elif ext in (".mp4", ".m4v", ".mov"):
+            from matplotlib import rcParams
+            ffmpeg = shutil.which(rcParams["animation.ffmpeg_path"])
+            if ffmpeg is None:
+                raise RuntimeError("MP4 export needs ffmpeg on PATH (GIF export only needs Pillow)")
+            self._proc = subprocess.Popen(
+                [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                 "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                 "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", out],
+                stdin=subprocess.PIPE)
+        else:
+            raise ValueError(f"Unsupported animation format '{ext}'; expected .gif or .mp4")
+
+    def write(self, rgba):
+        if self._proc is not None:
+            self._proc.stdin.write(rgba.tobytes())
+        else:
+            from PIL import Image
+            frame = Image.fromarray(rgba[:, :, :3])
+            self._frames.append(frame.quantize(256, method=Image.Quantize.FASTOCTREE))
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            if self._proc.wait():
+                raise RuntimeError(f"ffmpeg failed writing {self.out}")
+        elif self._frames:
+            # optimize=False: Pillow's inter-frame diffing costs more than it saves here
+            self._frames[0].save(self.out, save_all=True, append_images=self._frames[1:],
+                                 duration=int(1000 / self.fps), loop=0, optimize=False)
+
+
+def render_animation(source, out="epidemic_curve.gif", width=800, height=400, dpi=100,
+                     fps=20, max_frames=300, title="COVID-19 Simulation (SEIRV)"):
+    """Write an animation of the curves growing day by day to `out` (.gif or .mp4).
+
+    Axes, labels and legend are drawn once and cached; each frame restores
+    that background and draws only the five lines and the counts box. Series
+    are decimated to the plot width, and runs longer than `max_frames` days
+    advance several days per frame. Raises ValueError for a series with no days.
+    """
+    days, counts = _load_days(source)
+    fig, canvas = _figure(width, height, dpi)
+    ax = _axes(fig, days, counts, title)
+    lines = [ax.plot([], [], color=color, label=label, linewidth=lw, animated=True)[0]
+             for state, label, color, lw in SERIES]
+    ax.legend(loc="upper right")
+    text = ax.text(0.02, 0.95, "", transform=ax.transAxes, va="top", family="monospace",
+                   bbox=dict(boxstyle="round", facecolor="wheat", alpha=0.7), animated=True)
+    fig.tight_layout()
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    frame_w, frame_h = canvas.get_width_height()
+
+    px = _plot_width(fig, ax)
+    series = [decimate(days, counts[:, k], px) for k in range(len(STATES))]
+    step = max(1, math.ceil(len(days) / max_frames))
+    frames = list(range(step - 1, len(days), step))
+    if frames[-1] != len(days) - 1:
+        frames.append(len(days) - 1)
+
+    sink = _FrameSink(out, frame_w, frame_h, fps)
+    try:
+        for i in frames:
+            day = days[i]
+            canvas.restore_region(background)
+            for line, (x, y) in zip(lines, series):
+                k = np.searchsorted(x, day, side="right")
+                line.set_data(x[:k], y[:k])
+                ax.draw_artist(line)
+            text.set_text(f"Day {day}\n" + "\n".join(f"{s}: {c:,.0f}" for s, c in zip(STATES, counts[i])))
+            ax.draw_artist(text)
+            sink.write(np.asarray(canvas.buffer_rgba()))
+    finally:
+        sink.close()
+    return out
+
+
+def _render_task(task):
+    kind, source, out, kwargs = task
+    if kind == "curve":
+        return render_curve(source, out, **kwargs)
+    return render_animation(source, out, **kwargs)
+
+
+def render_batch(sources, out_dir="figures", kind="curve", fmt=None, n_workers=1, **kwargs):
+    """Render many runs in a process pool, headless.
+
+    sources: CSV paths, or (name, source) pairs where source is anything
+    load_counts accepts (e.g. a counts array from sweep.load_point). kind is
+    "curve" (default format png) or "animation" (default gif). Returns the
+    output paths in input order.
+    """
+    if kind not in ("curve", "animation"):
+        raise ValueError(f"Unknown kind '{kind}'; expected 'curve' or 'animation'")
+    fmt = fmt or ("png" if kind == "curve" else "gif")
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = []
+    for item in sources:
+        name, source = (os.path.splitext(os.path.basename(item))[0], item) if isinstance(item, str) else item
+        tasks.append((kind, source, os.path.join(out_dir, f"{name}.{fmt}"), kwargs))
+    if n_workers <= 1:
+        paths = list(map(_render_task, tasks))
+    else:
+        with multiprocessing.get_context().Pool(n_workers) as pool:
+            paths = pool.map(_render_task, tasks, chunksize=max(1, len(tasks) // (4 * n_workers)))
+    print(f"[INFO] Rendered {len(paths)} figure(s) to {out_dir}")
+    return paths
+
+
+def sweep_sources(store_dir):
+    """(point key, replicate-mean counts) for every shard of a sweep, for render_batch."""
+    from sweep import load_point
+    for name in sorted(os.listdir(store_dir)):
+        if name.endswith(".npz") and not name.startswith("."):
+            key = name[:-4]
+            yield key, load_point(store_dir, key)[1].mean(axis=0)
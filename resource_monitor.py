@@ -3,6 +3,7 @@ import threading
 import csv
 import os
 import sys
+from collections import deque
 from datetime import datetime
 
 try:
@@ -12,56 +13,256 @@ except Exception:
     psutil = None
     PSUTIL_AVAILABLE = False
 
+PROC_AVAILABLE = os.path.exists('/proc/self/stat')
+
+CSV_HEADER = ['timestamp_iso', 'relative_time_s', 'cpu_percent', 'mem_percent', 'rss_bytes',
+              'proc_cpu_percent', 'n_children', 'children_rss_bytes', 'children_cpu_percent']
+
+
+class _PsutilSampler:
+    """Reads system and process counters through psutil."""
+
+    def __init__(self, pid, children):
+        self.process = psutil.Process(pid)
+        self.children = children
+        self._child_procs = {}
+        # Warm up cpu counters so first reading is meaningful
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+
+    def sample(self):
+        cpu = psutil.cpu_percent(interval=None)
+        mem = psutil.virtual_memory().percent
+        rss = self.process.memory_info().rss
+        proc_cpu = self.process.cpu_percent(interval=None)
+        n_children = children_rss = children_cpu = None
+        if self.children:
+            n_children, children_rss, children_cpu = 0, 0, 0.0
+            alive = {}
+            for child in self.process.children(recursive=True):
+                child = self._child_procs.get(child.pid, child)
+                try:
+                    children_rss += child.memory_info().rss
+                    children_cpu += child.cpu_percent(interval=None)  # 0.0 on first sight
+                    n_children += 1
+                    alive[child.pid] = child
+                except psutil.Error:
+                    continue  # exited between listing and reading
+            self._child_procs = alive
+        return cpu, mem, rss, proc_cpu, n_children, children_rss, children_cpu
+
+
+class _ProcSampler:
+    """Reads the same counters straight from /proc (Linux), which costs a few
+    file reads per sample instead of psutil's object layer."""
+
+    def __init__(self, pid, children):
+        self.pid = pid
+        self.children = children
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self._cpu_prev = self._read_cpu()
+        # Baseline CPU ticks, so the first sample's per-process CPU covers
+        # only the time since construction
+        self._ticks_prev = {pid: self._proc_ticks(pid)}
+        if children:
+            for child in self._children(pid):
+                try:
+                    self._ticks_prev[child] = self._proc_ticks(child)
+                except (OSError, IndexError, ValueError):
+                    continue  # exited between listing and reading
+        self._time_prev = time.monotonic()
+
+    @staticmethod
+    def _read_cpu():
+        with open('/proc/stat') as f:
+            values = [int(v) for v in f.readline().split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        return sum(values), idle
+
+    def _rss(self, pid):
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * self.page_size
+
+    def _proc_ticks(self, pid):
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the parenthesised command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[11]) + int(fields[12])
+
+    def _children(self, pid):
+        found = []
+        try:
+            for tid in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{tid}/children') as f:
+                    found.extend(int(c) for c in f.read().split())
+        except OSError:
+            return found
+        for child in list(found):
+            found.extend(self._children(child))
+        return found
+
+    def sample(self):
+        now = time.monotonic()
+        elapsed = max(now - self._time_prev, 1e-9)
+        self._time_prev = now
+
+        total, idle = self._read_cpu()
+        prev_total, prev_idle = self._cpu_prev
+        self._cpu_prev = total, idle
+        busy = (total - prev_total) - (idle - prev_idle)
+        cpu = 100.0 * busy / (total - prev_total) if total > prev_total else 0.0
+
+        meminfo = {}
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                meminfo[key] = int(value.split()[0])
+        mem = 100.0 * (1 - meminfo['MemAvailable'] / meminfo['MemTotal'])
+
+        ticks = {}
+
+        def cpu_percent(pid):
+            ticks[pid] = self._proc_ticks(pid)
+            if pid not in self._ticks_prev:
+                return 0.0
+            return 100.0 * (ticks[pid] - self._ticks_prev[pid]) / self.ticks / elapsed
+
+        rss = self._rss(self.pid)
+        proc_cpu = cpu_percent(self.pid)
+        n_children = children_rss = children_cpu = None
+        if self.children:
+            n_children, children_rss, children_cpu = 0, 0, 0.0
+            for child in self._children(self.pid):
+                try:
+                    children_rss += self._rss(child)
+                    children_cpu += cpu_percent(child)
+                    n_children += 1
+                except (OSError, IndexError, ValueError):
+                    continue  # exited between listing and reading
+        self._ticks_prev = ticks
+        return cpu, mem, rss, proc_cpu, n_children, children_rss, children_cpu
+
+
 class ResourceMonitor:
     """
-    Samples system/process resource usage at `interval` seconds and writes to CSV.
+    Samples system/process resource usage at `interval` seconds and streams it to CSV.
+    Rows are written in batches every `flush_every` seconds, so a killed run keeps
+    its telemetry up to the last flush. Only the newest `history` samples stay in
+    memory (see recent()); summary() keeps running peak RSS and mean CPU figures.
     Missing metrics are written as 'N/A' (no nulls).
+
+    children=True adds the RSS and CPU of child processes (e.g. ensemble pool
+    workers). source='proc' reads counters directly from /proc instead of psutil,
+    which is cheaper at high sampling rates; 'auto' uses psutil when installed.
     """
-    def __init__(self, interval=0.1, csv_path='resource_usage.csv'):
+    def __init__(self, interval=0.1, csv_path='resource_usage.csv', flush_every=5.0,
+                 history=1024, children=True, source='auto'):
+        if source not in ('auto', 'psutil', 'proc'):
+            raise ValueError(f"Unknown source '{source}'; expected 'auto', 'psutil' or 'proc'")
+        if source == 'auto':
+            source = 'psutil' if PSUTIL_AVAILABLE else 'proc' if PROC_AVAILABLE else None
+        elif source == 'psutil' and not PSUTIL_AVAILABLE:
+            source = None
+        elif source == 'proc' and not PROC_AVAILABLE:
+            source = None
         self.interval = float(interval)
         self.csv_path = csv_path
+        self.flush_every = float(flush_every)
+        self.children = children
+        self.source = source
         self._stop = threading.Event()
         self._thread = None
-        self._samples = []
+        self._recent = deque(maxlen=history)
         self._start_time = None
+        self._reset_summary()
 
-        if not PSUTIL_AVAILABLE:
+        if source is None:
             print("Warning: psutil not available — resource fields will be 'N/A'.", file=sys.stderr)
 
-    def _sample_loop(self):
-        process = None
-        if PSUTIL_AVAILABLE:
-            try:
-                process = psutil.Process(os.getpid())
-            except Exception:
-                process = None
+    def _reset_summary(self):
+        self._n = 0
+        self._peak_rss = None
+        self._peak_total_rss = None
+        self._cpu_sum = self._proc_cpu_sum = self._total_cpu_sum = 0.0
+        self._cpu_n = self._proc_cpu_n = 0
+        self._last_ts = None
 
-        # Warm up cpu counters so first reading is meaningful
-        if PSUTIL_AVAILABLE:
-            try:
-                psutil.cpu_percent(interval=None)
-                if process is not None:
-                    process.cpu_percent(interval=None)
-            except Exception:
-                pass
+    def _make_sampler(self):
+        try:
+            if self.source == 'psutil':
+                return _PsutilSampler(os.getpid(), self.children)
+            if self.source == 'proc':
+                return _ProcSampler(os.getpid(), self.children)
+        except Exception:
+            pass
+        return None
 
+    def _sample_loop(self):
+        sampler = self._make_sampler()
+        pending = []
+        last_flush = time.time()
         while not self._stop.is_set():
             ts = time.time()
-            cpu = mem = rss = None
-            if PSUTIL_AVAILABLE:
+            values = (None,) * 7
+            if sampler is not None:
                 try:
-                    cpu = psutil.cpu_percent(interval=None)
-                    mem = psutil.virtual_memory().percent
-                    rss = process.memory_info().rss if process is not None else None
+                    values = sampler.sample()
                 except Exception:
-                    cpu = mem = rss = None
+                    values = (None,) * 7
 
             # store raw values; will be string-formatted on write
-            self._samples.append((ts, cpu, mem, rss))
-            time.sleep(self.interval)
+            sample = (ts,) + tuple(values)
+            self._recent.append(sample)
+            self._update_summary(sample)
+            pending.append(sample)
+            if ts - last_flush >= self.flush_every:
+                self._write_rows(pending)
+                pending = []
+                last_flush = ts
+            self._stop.wait(self.interval)
+        self._write_rows(pending)
+
+    def _update_summary(self, sample):
+        ts, cpu, mem, rss, proc_cpu, n_children, children_rss, children_cpu = sample
+        self._n += 1
+        self._last_ts = ts
+        if isinstance(rss, (int, float)):
+            self._peak_rss = max(self._peak_rss or 0, rss)
+            total = rss + (children_rss or 0)
+            self._peak_total_rss = max(self._peak_total_rss or 0, total)
+        if isinstance(cpu, (int, float)):
+            self._cpu_sum += cpu
+            self._cpu_n += 1
+        if isinstance(proc_cpu, (int, float)):
+            self._proc_cpu_sum += proc_cpu
+            self._total_cpu_sum += proc_cpu + (children_cpu or 0)
+            self._proc_cpu_n += 1
+
+    def _write_rows(self, rows):
+        writer = csv.writer(self._file)
+        for ts, *values in rows:
+            ts_iso = datetime.utcfromtimestamp(ts).isoformat() + 'Z'
+            rel = round(ts - (self._start_time or ts), 3)
+            formatted = []
+            for value in values:
+                if isinstance(value, float):
+                    formatted.append(f"{value:.2f}")
+                elif isinstance(value, int):
+                    formatted.append(str(value))
+                else:
+                    formatted.append('N/A')
+            writer.writerow([ts_iso, rel, *formatted])
+        self._file.flush()
 
     def start(self):
         self._start_time = time.time()
+        self._reset_summary()
+        self._recent.clear()
+        os.makedirs(os.path.dirname(self.csv_path) or '.', exist_ok=True)
+        self._file = open(self.csv_path, 'w', newline='')
+        csv.writer(self._file).writerow(CSV_HEADER)
+        self._file.flush()
         self._stop.clear()
         self._thread = threading.Thread(target=self._sample_loop, daemon=True)
         self._thread.start()
@@ -70,19 +271,30 @@ class ResourceMonitor:
         self._stop.set()
         if self._thread:
             self._thread.join()
-        self._write_csv()
+            self._thread = None
+            self._file.close()
 
-    def _write_csv(self):
-        os.makedirs(os.path.dirname(self.csv_path) or '.', exist_ok=True)
-        with open(self.csv_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp_iso', 'relative_time_s', 'cpu_percent', 'mem_percent', 'rss_bytes'])
-            for ts, cpu, mem, rss in self._samples:
-                ts_iso = datetime.utcfromtimestamp(ts).isoformat() + 'Z'
-                rel = round(ts - (self._start_time or ts), 3)
-                cpu_val = f"{cpu:.2f}" if isinstance(cpu, (int, float)) else 'N/A'
-                mem_val = f"{mem:.2f}" if isinstance(mem, (int, float)) else 'N/A'
-                rss_val = str(rss) if isinstance(rss, (int, float)) else 'N/A'
-                writer.writerow([ts_iso, rel, cpu_val, mem_val, rss_val])
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
 
+    def recent(self, n=None):
+        """The newest `n` samples (all retained ones by default) as tuples in
+        CSV_HEADER order, with the raw timestamp in place of the two time columns."""
+        samples = list(self._recent)
+        return samples if n is None else samples[-n:]
 
+    def summary(self):
+        """Running statistics over every sample taken since start()."""
+        return {
+            'samples': self._n,
+            'duration_s': (self._last_ts - self._start_time) if self._last_ts else 0.0,
+            'peak_rss_bytes': self._peak_rss,
+            'peak_total_rss_bytes': self._peak_total_rss,
+            'mean_cpu_percent': self._cpu_sum / self._cpu_n if self._cpu_n else None,
+            'mean_proc_cpu_percent': self._proc_cpu_sum / self._proc_cpu_n if self._proc_cpu_n else None,
+            'mean_total_cpu_percent': self._total_cpu_sum / self._proc_cpu_n if self._proc_cpu_n else None,
+        }
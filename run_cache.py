@@ -0,0 +1,178 @@
+# run_cache.py
+#
+# Content-addressed on-disk cache of completed runs. A run's key is a hash of
+# its full Simulation configuration (every constructor argument, defaults
+# filled in, plus the name, size and mtime of a network's files), the
+# horizon, the seed and run() options, so the same request always maps to
+# the same entry and different requests never share one. Each
+# entry is one .npz of the DataCollector's compact count arrays, written
+# atomically; the directory is kept under a size cap by evicting the least
+# recently used entries (file mtime is bumped on every hit).
+#
+#   cache = RunCache("run_cache", max_bytes=512 * 2**20)
+#   key, collector = cache.run(200, population=1000, beta=0.1, seed=7)
+
+import hashlib
+import inspect
+import json
+import os
+import numpy as np
+
+DEFAULT_DIR = "run_cache"
+DEFAULT_MAX_BYTES = 512 * 2**20
+VERSION = 1  # bump when a model change makes stored runs stale
+# Arguments with no stable serialised form (or with side outputs a cache hit
+# would not reproduce); runs using them are not cached
+_UNCACHEABLE = ("incubation", "infectious_period", "event_log", "environment", "profiler")
+
+
+def run_key(days, fast_forward=True, **sim_kwargs):
+    """Cache key for Simulation(**sim_kwargs).run(days, fast_forward).
+
+    Raises ValueError for runs that are not reproducible (seed=None) or whose
+    configuration has no stable serialised form (custom dwell-time samplers,
+    an in-memory network, an event log or a prebuilt environment).
+    """
+    from simulation import Simulation
+    bound = inspect.signature(Simulation).bind(**sim_kwargs)
+    bound.apply_defaults()
+    config = dict(bound.arguments)
+    del config["horizon"]  # only sizes the collector's buffers
+    if config["seed"] is None:
+        raise ValueError("Runs with seed=None are not reproducible and cannot be cached")
+    for name in _UNCACHEABLE:
+        if config[name] is not None:
+            raise ValueError(f"Runs with a custom '{name}' cannot be cached")
+    network = config["network"]
+    if network is not None and not isinstance(network, str):
+        raise ValueError("Only networks given as a directory path can be cached")
+    if network is not None:
+        config["network"] = {"path": os.path.abspath(network), "files": _network_files(network)}
+    config.update(days=days, fast_forward=fast_forward, version=VERSION)
+    canonical = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:24]
+
+
+def _network_files(path):
+    """(relative name, size, mtime_ns) of every file under a network path, so
+    a network rebuilt in place gets a new key."""
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [[os.path.basename(path), st.st_size, st.st_mtime_ns]]
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            files.append([os.path.relpath(full, path), st.st_size, st.st_mtime_ns])
+    return files
+
+
+class RunCache:
+    """Directory of cached runs with a size cap and LRU eviction."""
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def keys(self):
+        return [name[:-4] for name in os.listdir(self.directory)
+                if name.endswith(".npz") and not name.startswith(".")]
+
+    def get(self, key):
+        """The cached run's DataCollector, or None on a miss."""
+        from data_collector import DataCollector
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                meta = json.loads(str(entry["meta"]))
+                snapshot = {name: entry[name] for name in ("days", "counts", "incidence", "ever_infected")}
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass  # evicted by another process meanwhile; the data is already loaded
+        collector = DataCollector(horizon=max(1, len(snapshot["days"])),
+                                  track_incidence=meta["track_incidence"])
+        collector.load_snapshot({**snapshot, **meta["totals"]})
+        return collector
+
+    def put(self, key, collector):
+        """Store a DataCollector under `key`, then evict down to the size cap."""
+        snapshot = collector.snapshot()
+        meta = {"track_incidence": collector.track_incidence,
+                "totals": {name: snapshot[name] for name in ("current", "cumulative", "new_infections")}}
+        tmp = os.path.join(self.directory, f".{key}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, meta=json.dumps(meta), days=snapshot["days"].astype(np.int32),
+                 counts=snapshot["counts"].astype(np.int32),
+                 incidence=snapshot["incidence"].astype(np.int32),
+                 ever_infected=snapshot["ever_infected"].astype(np.int32))
+        os.replace(tmp, self.path(key))  # atomic: concurrent writers of one key store the same run
+        self.evict()
+
+    def run(self, days, fast_forward=True, **sim_kwargs):
+        """(key, DataCollector) for Simulation(**sim_kwargs).run(days), simulated
+        and stored only on a cache miss."""
+        key = run_key(days, fast_forward, **sim_kwargs)
+        collector = self.get(key)
+        if collector is None:
+            from simulation import Simulation
+            sim = Simulation(**{"horizon": days, **sim_kwargs})
+            sim.run(days, fast_forward=fast_forward)
+            sim.close()
+            collector = sim.data_collector
+            self.put(key, collector)
+        return key, collector
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        out = []
+        for key in self.keys():
+            try:
+                st = os.stat(self.path(key))
+            except FileNotFoundError:
+                continue
+            out.append((st.st_mtime, st.st_size, key))
+        return out
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for key in self.keys():
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+
+_default = None
+
+
+def default_cache():
+    """Process-wide RunCache in DEFAULT_DIR (or $SEIRV_CACHE_DIR)."""
+    global _default
+    if _default is None:
+        _default = RunCache(os.environ.get("SEIRV_CACHE_DIR", DEFAULT_DIR))
+    return _default
@@ -1,84 +1,73 @@
-from simulation import Simulation
+from ensemble import iter_replicates, config_params
 import config
+import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from scipy.integrate import odeint
 from matplotlib.widgets import CheckButtons
 from resource_monitor import ResourceMonitor
+from ensemble_stats import EnsembleAggregator, ConvergenceTracker, TARGETS
+from agent import STATES
+from ode import solve_seirv
 
-def seirv_ode(y, t, beta, sigma, gamma, nu):
-    S, E, I, R, V = y
-    N = S + E + I + R + V
-    dSdt = -beta * S * I / N - nu * S
-    dEdt = beta * S * I / N - sigma * E
-    dIdt = sigma * E - gamma * I
-    dRdt = gamma * I
-    dVdt = nu * S
-    return [dSdt, dEdt, dIdt, dRdt, dVdt]
+def run_multiple(n_runs=50, population=1000, timesteps=200, resource_csv='resource_usage.csv',
+                 n_workers=1, seed=None, engine="object", spill_path=None, tol=None, min_runs=10,
+                 targets=TARGETS):
+    """Run an ensemble, write simulation_results_mean.csv (means and 5/50/95%
+    quantiles per compartment) and plot the mean infected curve against the ODE.
 
-def run_multiple(n_runs=50, population=1000, timesteps=200, resource_csv='resource_usage.csv'):
+    spill_path: optional .npy file that receives every trajectory as a
+    memory-mapped (n_runs, timesteps, 5) int32 array.
+    engine: "object" / "numpy" for the agent-based model, or "tau" for the
+    compartmental surrogate (compartmental.py).
+    tol: adaptive mode. Replicates run until the 95% CI half-width of every
+    target in `targets` (peak I, day of peak, final R, per-day I band; see
+    ensemble_stats.ConvergenceTracker) is within `tol` of its estimate, after
+    at least `min_runs` and at most `n_runs` runs. With spill_path, rows
+    beyond the runs actually made stay zero.
+    Returns the number of replicates run.
+    """
     # Start resource monitor sampling every 0.10s
     monitor = ResourceMonitor(interval=0.1, csv_path=resource_csv)
     monitor.start()
 
     try:
-        runs_S = []
-        runs_E = []
-        runs_I = []
-        runs_R = []
-        runs_V = []
-
-        for r in range(n_runs):
-            sim = Simulation(population=population,
-                             beta=config.BETA, sigma=config.SIGMA,
-                             gamma=config.GAMMA, nu=config.NU,
-                             mask_effect=config.MASK_EFFECT,
-                             vaccine_effect=config.VACC_EFFECT)
-            for _ in range(timesteps):
-                sim.step()
-            df = pd.DataFrame(sim.data_collector.records)
-
-            runs_S.append(df["S"].values[:timesteps])
-            runs_E.append(df["E"].values[:timesteps])
-            runs_I.append(df["I"].values[:timesteps])
-            runs_R.append(df["R"].values[:timesteps])
-            runs_V.append(df["V"].values[:timesteps])
-
-        mean_S = np.mean(np.vstack(runs_S), axis=0)
-        mean_E = np.mean(np.vstack(runs_E), axis=0)
-        mean_I = np.mean(np.vstack(runs_I), axis=0)
-        mean_R = np.mean(np.vstack(runs_R), axis=0)
-        mean_V = np.mean(np.vstack(runs_V), axis=0)
+        seed = np.random.SeedSequence(seed).entropy
+        print(f"[INFO] Ensemble seed: {seed}")
+        # Replicates are folded into running statistics as they finish, so
+        # memory does not grow with n_runs
+        agg = EnsembleAggregator(timesteps, spill_path=spill_path, n_runs=n_runs)
+        tracker = None
+        if tol is not None:
+            tracker = ConvergenceTracker(timesteps, tol=tol, targets=targets, min_runs=min_runs)
+        for counts in iter_replicates(n_runs, population, timesteps, n_workers=n_workers,
+                                      seed=seed, engine=engine, tracker=tracker, **config_params()):
+            agg.add(counts)
+        agg.close()
+        if tracker is not None:
+            widths = ", ".join(f"{t} ±{w:.3f}" for t, w in tracker.half_widths().items())
+            status = "Converged" if tracker.converged() else f"Reached n_runs={n_runs} without converging"
+            print(f"[INFO] {status} after {agg.count} runs ({widths})")
+        if spill_path is not None:
+            print(f"[INFO] Trajectories saved to {spill_path}")
 
         t = np.arange(timesteps)
-        df_mean = pd.DataFrame({
-            "Day": t,
-            "S": mean_S,
-            "E": mean_E,
-            "I": mean_I,
-            "R": mean_R,
-            "V": mean_V
-        })
+        df_mean = pd.DataFrame({"Day": t, **agg.summary_columns()})
         df_mean.to_csv("simulation_results_mean.csv", index=False)
+        mean_I = agg.mean[:, STATES.index('I')]
+        std_I = agg.std[:, STATES.index('I')]
 
-        S0 = population - 1
-        E0 = 0
-        I0 = 1
-        R0 = 0
-        V0 = 0
-        y0 = [S0, E0, I0, R0, V0]
-        sol = odeint(seirv_ode, y0, t, args=(config.BETA, config.SIGMA, config.GAMMA, config.NU))
+        sol = solve_seirv(t, config.BETA, config.SIGMA, config.GAMMA, config.NU, N=population, I0=1)
         ode_I = sol[:, 2]
 
         fig, ax = plt.subplots(figsize=(8, 4))
         abm_line, = ax.plot(t, mean_I, label="ABM Mean Infected")
         ax.fill_between(t,
-                        mean_I - np.std(np.vstack(runs_I), axis=0),
-                        mean_I + np.std(np.vstack(runs_I), axis=0),
+                        mean_I - std_I,
+                        mean_I + std_I,
                         alpha=0.3, label="ABM ±1 Std Dev")
         ode_line, = ax.plot(t, ode_I, 'r--', label="ODE Infected", visible=False)
-        ax.set_title(f"ABM vs ODE: Mean Infection Curve Across {n_runs} Simulations")
+        ax.set_title(f"ABM vs ODE: Mean Infection Curve Across {agg.count} Simulations")
         ax.set_xlabel("Day")
         ax.set_ylabel("Infected Count")
         ax.legend()
@@ -98,6 +87,11 @@ def run_multiple(n_runs=50, population=1000, timesteps=200, resource_csv='resour
     finally:
         # Ensure monitor is stopped and CSV is written even on error
         monitor.stop()
+        usage = monitor.summary()
+        if usage['peak_total_rss_bytes'] is not None:
+            print(f"[INFO] Peak RSS (incl. workers): {usage['peak_total_rss_bytes'] / 2**20:.0f} MiB, "
+                  f"mean CPU: {usage['mean_total_cpu_percent']:.0f}%")
+    return agg.count
 
 if __name__ == "__main__":
-    run_multiple()
+    run_multiple(n_workers=os.cpu_count())
@@ -0,0 +1,227 @@
+# sharded.py
+#
+# One very large well-mixed population split across worker processes. The
+# population arrays live in shared memory and are cut into contiguous shards;
+# each day runs in two parallel phases separated by a barrier:
+#
+#   1. infect  - every shard draws the contacts of its infectious agents
+#                anywhere in the population, runs the Bernoulli trials against
+#                the (read-only) start-of-day state and returns the hits
+#                grouped by the shard that owns each target;
+#   2. update  - every shard merges the hits addressed to it (in source-shard
+#                order), applies S→E, E→I, I→R and S→V to its own agents only
+#                and returns its S, E, I, R, V counts.
+#
+# Every (day, shard, phase) has its own SeedSequence child, so results depend
+# on the seed and the number of shards but not on the number of workers.
+# Shard tasks carry their simulation's token (the name of its first shared
+# block), so several ShardedSimulations can live in one process.
+
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from data_collector import DataCollector
+from numpy_engine import S, E, I, R, V, CONTACTS_PER_DAY
+
+_INFECT, _UPDATE, _INIT = range(3)
+_ARRAYS = (("state", np.uint8), ("mask", np.bool_), ("vaccinated", np.bool_), ("ever_infected", np.bool_))
+
+_contexts = {}  # token -> this process's view of a simulation's shared arrays
+
+
+class _Context:
+    """Shared arrays (attached by name) plus everything a shard task needs."""
+
+    def __init__(self, names, population, bounds, entropy, params):
+        self.names = names
+        self.population = population
+        self.bounds = bounds
+        self.entropy = entropy
+        self.params = params
+        self._blocks = []
+        for (name, dtype), shm_name in zip(_ARRAYS, names):
+            block = shared_memory.SharedMemory(name=shm_name)
+            self._blocks.append(block)
+            setattr(self, name, np.ndarray((population,), dtype=dtype, buffer=block.buf))
+
+    def rng(self, day, shard, phase):
+        return np.random.default_rng(np.random.SeedSequence(self.entropy, spawn_key=(day, shard, phase)))
+
+    def close(self):
+        for name, _ in _ARRAYS:
+            setattr(self, name, None)
+        for block in self._blocks:
+            block.close()
+        self._blocks = []
+
+
+def _attach(names, population, bounds, entropy, params):
+    """Attach a simulation's shared arrays in this process (pool initializer)."""
+    ctx = _Context(names, population, bounds, entropy, params)
+    _contexts[names[0]] = ctx
+    return ctx
+
+
+def _init_shard(task):
+    token, shard = task
+    ctx = _contexts[token]
+    lo, hi = ctx.bounds[shard], ctx.bounds[shard + 1]
+    rng = ctx.rng(0, shard, _INIT)
+    ctx.state[lo:hi] = S
+    ctx.mask[lo:hi] = rng.random(hi - lo) < ctx.params["mask_rate"]
+    ctx.vaccinated[lo:hi] = rng.random(hi - lo) < ctx.params["vaccine_rate"]
+    ctx.ever_infected[lo:hi] = False
+
+
+def _infect_shard(task):
+    """Phase 1: trials for the contacts of this shard's infectious agents.
+    Returns one array of hit agent ids per destination shard."""
+    token, shard, day = task
+    ctx = _contexts[token]
+    p = ctx.params
+    n_shards = len(ctx.bounds) - 1
+    lo, hi = ctx.bounds[shard], ctx.bounds[shard + 1]
+    infectious = lo + np.flatnonzero(ctx.state[lo:hi] == I)
+    if infectious.size == 0:
+        return [np.empty(0, dtype=np.int64)] * n_shards
+    rng = ctx.rng(day, shard, _INFECT)
+    k = min(CONTACTS_PER_DAY, ctx.population)
+    infectors = np.repeat(infectious, k)
+    contacts = rng.integers(0, ctx.population, size=infectors.size)
+    trials = np.flatnonzero(ctx.state[contacts] == S)
+    infectors, contacts = infectors[trials], contacts[trials]
+    e_m = np.where(ctx.mask[infectors] | ctx.mask[contacts], p["mask_effect"], 0.0)
+    e_v = np.where(ctx.vaccinated[contacts], p["vaccine_effect"], 0.0)
+    hits = contacts[rng.random(contacts.size) < p["beta"] * (1 - e_m) * (1 - e_v)]
+    hits.sort()
+    cuts = np.searchsorted(hits, ctx.bounds[1:-1])
+    return np.split(hits, cuts)
+
+
+def _update_shard(task):
+    """Phase 2: apply today's transitions to this shard and return its counts."""
+    token, shard, day, incoming = task
+    ctx = _contexts[token]
+    p = ctx.params
+    lo, hi = ctx.bounds[shard], ctx.bounds[shard + 1]
+    rng = ctx.rng(day, shard, _UPDATE)
+    state = ctx.state[lo:hi]
+    infectious = np.flatnonzero(state == I)  # start-of-day set, as in NumpyEngine.step
+    # A susceptible hit from several shards is exposed once
+    exposed = np.unique(np.concatenate(incoming)) - lo
+    state[exposed] = E
+    ctx.ever_infected[lo + exposed] = True
+    all_exposed = np.flatnonzero(state == E)
+    progressed = all_exposed[rng.random(all_exposed.size) < p["sigma"]]
+    state[progressed] = I
+    recovered = infectious[rng.random(infectious.size) < p["gamma"]]
+    state[recovered] = R
+    susceptible = np.flatnonzero(state == S)
+    n = rng.binomial(susceptible.size, p["nu"])
+    state[susceptible[rng.choice(susceptible.size, n, replace=False)]] = V
+    return exposed.size, progressed.size, recovered.size, n
+
+
+class ShardedSimulation:
+    """Single well-mixed population simulated by `n_workers` processes.
+
+    Follows the numpy engine's rules (random contacts, daily progression).
+    The population is split into `n_shards` contiguous shards (default 4 per
+    worker); the shard count, not the worker count, fixes the random
+    streams. Use as a context manager or call close() to release the shared
+    memory. Each day's per-shard flows are summed into one incremental
+    DataCollector.
+    """
+
+    def __init__(self, population=1000, beta=0.10, sigma=0.20, gamma=0.14, nu=0.02,
+                 mask_effect=0.60, vaccine_effect=0.85, mask_rate=0.6, vaccine_rate=0.4,
+                 seed=None, n_workers=None, n_shards=None, horizon=None, track_incidence=False):
+        self.population = population
+        self.n_workers = n_workers or multiprocessing.cpu_count()
+        n_shards = n_shards or 4 * self.n_workers
+        if not 1 <= n_shards <= population:
+            raise ValueError(f"n_shards must be between 1 and population, got {n_shards}")
+        self.n_shards = n_shards
+        self.params = dict(beta=beta, sigma=sigma, gamma=gamma, nu=nu, mask_effect=mask_effect,
+                           vaccine_effect=vaccine_effect, mask_rate=mask_rate, vaccine_rate=vaccine_rate)
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.day = 0
+        self.data_collector = DataCollector(horizon=horizon, track_incidence=track_incidence)
+        self.bounds = np.linspace(0, population, n_shards + 1).astype(np.int64)
+
+        self._blocks, self._pool, self._ctx = [], None, None
+        try:
+            # Released by close() if anything below fails
+            for _, dtype in _ARRAYS:
+                self._blocks.append(shared_memory.SharedMemory(
+                    create=True, size=max(1, population * np.dtype(dtype).itemsize)))
+            init_args = ([b.name for b in self._blocks], population, self.bounds, self.seed, self.params)
+            self._token = init_args[0][0]
+            if self.n_workers > 1:
+                self._pool = multiprocessing.get_context().Pool(self.n_workers, initializer=_attach,
+                                                                initargs=init_args)
+                self._map = self._pool.map
+            else:
+                self._map = lambda func, tasks: list(map(func, tasks))
+            self._ctx = _attach(*init_args)  # the parent also reads the arrays
+
+            self._map(_init_shard, [(self._token, s) for s in range(n_shards)])
+            # Initialize one infected case
+            self._ctx.state[0] = I
+            self._ctx.ever_infected[0] = True
+            self.data_collector.start([population - 1, 0, 1, 0, 0])
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def state(self):
+        """The shared state array (uint8 codes, see agent.STATE_CODES)."""
+        return self._ctx.state
+
+    def step(self):
+        """Perform one day of simulation across all shards."""
+        self.day += 1
+        shards = range(self.n_shards)
+        outboxes = self._map(_infect_shard, [(self._token, s, self.day) for s in shards])
+        # Deterministic merge: each shard receives its hits in source-shard order
+        flows = self._map(_update_shard, [(self._token, s, self.day, [box[s] for box in outboxes])
+                                          for s in shards])
+        collector = self.data_collector
+        for (src, dst), n in zip(((S, E), (E, I), (I, R), (S, V)), np.sum(flows, axis=0).tolist()):
+            collector.transition(src, dst, n)
+        collector.record_day(self.day)
+
+    def burned_out(self):
+        """True when no agent is in E or I, so only S→V can still happen."""
+        current = self.data_collector.current
+        return current[E] + current[I] == 0
+
+    def run(self, days, stop_early=False):
+        """Advance `days` days and return the number of days simulated; with
+        stop_early=True the run ends once the epidemic has burned out."""
+        for done in range(days):
+            if stop_early and self.burned_out():
+                return done
+            self.step()
+        return days
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._ctx is not None:
+            _contexts.pop(self._token, None)
+            self._ctx.close()
+            self._ctx = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
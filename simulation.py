@@ -1,16 +1,88 @@
 # simulation.py
 
+import json
+import math
+import os
 import random
-from environment import Environment
+import tempfile
+from collections import defaultdict
+import numpy as np
+from environment import Environment, TIMER_LIMIT
 from data_collector import DataCollector
+from dwell_times import geometric_dwell
+from agent import STATES, STATE_CODES
+from profiler import CONTACTS_DRAWN, TRIALS, TRANSMISSION, PROGRESSION, VACCINATION, RECORD
+
+ENGINES = ("object", "numpy")
+PROGRESSIONS = ("daily", "scheduled")
+PARAMETERS = ("beta", "sigma", "gamma", "nu", "mask_effect", "vaccine_effect",
+              "mask_rate", "vaccine_rate")
+# Settings a restored or forked simulation may change
+RESTORE_OVERRIDES = ("beta", "sigma", "gamma", "nu", "mask_effect", "vaccine_effect",
+                     "incubation", "infectious_period", "event_log", "network", "profiler")
 
 class Simulation:
-    """Main simulation manager controlling the SEIRV process."""
+    """Main simulation manager controlling the SEIRV process.
+
+    engine="object" steps a list of Agent objects; engine="numpy" runs the same
+    model on arrays (see numpy_engine.py) and is meant for large populations.
+    seed=None keeps the object engine on the global `random` module.
+    compact=True stores the object engine's population as arrays (the numpy
+    engine always does).
+
+    progression="daily" draws E→I and I→R every day for every E/I agent.
+    progression="scheduled" samples each agent's incubation and infectious
+    durations once (from `incubation` / `infectious_period`, see dwell_times.py;
+    geometric in sigma / gamma by default, matching the daily mode), stores the
+    due day in `infection_timer` and processes only the agents due that day.
+
+    event_log: optional path (or event_log.TransmissionLog) that receives every
+    transmission as (day, infector id, infectee id, p); call close() at the
+    end of the run to flush it.
+
+    Every state change is reported to the DataCollector, which keeps running
+    counts, so recording a day does not scan the population. `horizon`
+    presizes its arrays; track_incidence=True adds daily new infections and
+    cumulative ever-infected columns.
+
+    mask_rate / vaccine_rate are the population coverages passed to Environment.
+
+    network: optional contact_network.ContactNetwork (or the directory of a
+    saved one, which is memory-mapped). Infectious agents then meet all of
+    their network neighbours each day instead of 10 random agents.
+
+    environment: optional prebuilt Environment used as-is (no index case is
+    seeded); the numpy engine needs a compact one. checkpoint() / restore()
+    / fork() save and resume a run (see their docstrings).
+
+    profiler: optional profiler.StepProfiler that records the time spent in
+    each phase of step() and per-day contact / trial / transition counters.
+    """
 
     def __init__(self, population=1000, beta=0.10, sigma=0.20, gamma=0.14, nu=0.02,
-                 mask_effect=0.60, vaccine_effect=0.85):
-        self.environment = Environment(population)
-        self.data_collector = DataCollector()
+                 mask_effect=0.60, vaccine_effect=0.85, engine="object", seed=None,
+                 compact=False, progression="daily", incubation=None, infectious_period=None,
+                 event_log=None, horizon=None, track_incidence=False,
+                 mask_rate=0.6, vaccine_rate=0.4, network=None, environment=None,
+                 profiler=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'; expected one of {ENGINES}")
+        if progression not in PROGRESSIONS:
+            raise ValueError(f"Unknown progression '{progression}'; expected one of {PROGRESSIONS}")
+        self.engine = engine
+        self.progression = progression
+        if isinstance(event_log, str):
+            from event_log import TransmissionLog
+            event_log = TransmissionLog(event_log)
+        self.event_log = event_log
+        if isinstance(network, str):
+            from contact_network import ContactNetwork
+            network = ContactNetwork.load(network)
+        if network is not None and network.n_nodes != population:
+            raise ValueError(f"Network has {network.n_nodes} nodes but population is {population}")
+        self.network = network
+        self.profiler = profiler
+        self.data_collector = DataCollector(horizon=horizon, track_incidence=track_incidence)
         self.day = 0
 
         # Parameters
@@ -20,13 +92,180 @@ class Simulation:
         self.nu = nu
         self.mask_effect = mask_effect
         self.vaccine_effect = vaccine_effect
+        self.mask_rate = mask_rate
+        self.vaccine_rate = vaccine_rate
+
+        if progression == "scheduled":
+            self.incubation = incubation or geometric_dwell(sigma)
+            self.infectious_period = infectious_period or geometric_dwell(gamma)
+        # day -> agents whose next transition falls due that day
+        self._calendar = defaultdict(list)
+
+        if engine == "numpy":
+            from numpy_engine import NumpyEngine, I
+            self.rng = np.random.default_rng(seed)
+            if environment is None:
+                self.environment = Environment(population, mask_rate, vaccine_rate,
+                                               rng=self.rng, compact=True)
+                # Initialize one infected case
+                self.environment.state[0] = I
+                self.environment.ever_infected[0] = True
+            elif not environment.compact:
+                raise ValueError("The numpy engine needs a compact Environment")
+            else:
+                self.environment = environment
+            self._engine = NumpyEngine(self.environment, self.rng, self.data_collector)
+            self.data_collector.start(self._engine.counts(), int(self.environment.ever_infected.sum()))
+        else:
+            self._engine = None
+            self.rng = random if seed is None else random.Random(seed)
+            if environment is None:
+                self.environment = Environment(population, mask_rate, vaccine_rate,
+                                               rng=self.rng, compact=compact)
+
+                # Initialize one infected case
+                self.environment.population[0].state = 'I'
+
+                # Ensure at least one infected individual
+                if not any(agent.state == 'I' for agent in self.environment.population):
+                    self.environment.population[0].state = 'I'
+                self.environment.population[0].ever_infected = True
+            else:
+                self.environment = environment
+
+            self.rebuild_indices()
+
+        if progression == "scheduled":
+            self._schedule_initial()
+
+    def _schedule_initial(self):
+        """Book the next transition of every agent that starts in E or I.
+
+        Agents whose infection_timer is already in the future (a restored
+        checkpoint) keep that due day; the others get fresh durations.
+        """
+        if self._engine is not None:
+            from numpy_engine import E, I
+            state = self._engine.state
+            timer = self._engine.infection_timer
+            for code in (E, I):
+                ids = (state == code).nonzero()[0]
+                booked = timer[ids] > self.day
+                self._engine.book(self, ids[booked], timer[ids[booked]].astype(np.int64))
+                # Steps start at day + 1, so initial exposures count from there
+                start = self.day + 1 if code == E else self.day
+                self._engine.schedule(self, ids[~booked], code, start=start)
+        else:
+            agents = self.environment.population
+            for state, ids in (('E', self._exposed), ('I', self._infectious)):
+                for i in sorted(ids):
+                    agent = agents[i]
+                    if agent.infection_timer > self.day:
+                        self._calendar[agent.infection_timer].append(i)
+                    else:
+                        start = self.day + 1 if state == 'E' else self.day
+                        self._schedule(agent, state, start=start)
+
+    def rebuild_indices(self):
+        """Rebuild the per-state index structures and the DataCollector's
+        running counts from the agents' states.
+
+        The object engine only visits agents listed here, so call this after
+        changing `agent.state` directly instead of through a step.
+        """
+        self._exposed = set()
+        self._infectious = set()
+        self._susceptible = []      # pool of S ids, swap-removed in O(1)
+        self._susceptible_pos = {}  # id -> position in self._susceptible
+        counts = [0] * len(STATES)
+        ever_infected = 0
+        for agent in self.environment.population:
+            self._index_add(agent.id, agent.state)
+            counts[STATE_CODES[agent.state]] += 1
+            ever_infected += agent.ever_infected
+        self.data_collector.start(counts, ever_infected)
+
+    def _index_add(self, agent_id, state):
+        if state == 'E':
+            self._exposed.add(agent_id)
+        elif state == 'I':
+            self._infectious.add(agent_id)
+        elif state == 'S':
+            self._susceptible_pos[agent_id] = len(self._susceptible)
+            self._susceptible.append(agent_id)
 
-        # Initialize one infected case
-        self.environment.population[0].state = 'I'
+    def _index_remove(self, agent_id, state):
+        if state == 'E':
+            self._exposed.discard(agent_id)
+        elif state == 'I':
+            self._infectious.discard(agent_id)
+        elif state == 'S':
+            pos = self._susceptible_pos.pop(agent_id)
+            last = self._susceptible.pop()
+            if last != agent_id:
+                self._susceptible[pos] = last
+                self._susceptible_pos[last] = pos
 
-        # Ensure at least one infected individual
-        if not any(agent.state == 'I' for agent in self.environment.population):
-            self.environment.population[0].state = 'I'
+    def _transition(self, agent, new_state):
+        """Move an agent to `new_state`, keeping the index structures in sync."""
+        old_state = agent.state
+        self._index_remove(agent.id, old_state)
+        agent.state = new_state
+        self._index_add(agent.id, new_state)
+        self.data_collector.transition(STATE_CODES[old_state], STATE_CODES[new_state])
+        if new_state == 'E':
+            agent.ever_infected = True
+        if self.progression == "scheduled" and new_state in ('E', 'I'):
+            self._schedule(agent, new_state)
+
+    def _schedule(self, agent, state, start=None):
+        """Book the next transition for an agent that entered E or I on day `start`.
+
+        An agent exposed on day t with an incubation of d days becomes
+        infectious in the progression phase of day t + d - 1 (the daily mode
+        also lets exposures progress the same day); an agent infectious from
+        day t with an infectious period of d days recovers on day t + d.
+        """
+        start = self.day if start is None else start
+        if state == 'E':
+            due = start + int(self.incubation(self.rng, 1)[0]) - 1
+        else:
+            due = start + int(self.infectious_period(self.rng, 1)[0])
+        if due >= TIMER_LIMIT:
+            raise ValueError(f"Due day {due} does not fit infection_timer (limit {TIMER_LIMIT})")
+        agent.infection_timer = due
+        self._calendar[due].append(agent.id)
+
+    def _process_due(self, agents):
+        """Apply the E→I / I→R transitions scheduled for today."""
+        for i in self._calendar.pop(self.day, ()):
+            agent = agents[i]
+            if agent.infection_timer != self.day:
+                continue  # superseded booking
+            if agent.state == 'E':
+                self._transition(agent, 'I')
+            elif agent.state == 'I':
+                self._transition(agent, 'R')
+
+    def _sample_vaccinations(self):
+        """Ids of susceptibles that get vaccinated today.
+
+        Equivalent to one Bernoulli(nu) draw per susceptible, but walks the
+        pool with geometric skips so the cost is proportional to the number
+        vaccinated rather than the number of susceptibles.
+        """
+        pool = self._susceptible
+        if self.nu <= 0 or not pool:
+            return []
+        if self.nu >= 1:
+            return list(pool)
+        log_q = math.log(1 - self.nu)
+        chosen = []
+        i = int(math.log(1 - self.rng.random()) / log_q)
+        while i < len(pool):
+            chosen.append(pool[i])
+            i += 1 + int(math.log(1 - self.rng.random()) / log_q)
+        return chosen
 
     def infection_probability(self, agent_i, agent_j):
         """Equation 6: P(infection) = β * (1 - e_m) * (1 - e_v)"""
@@ -34,38 +273,234 @@ class Simulation:
         e_v = self.vaccine_effect if agent_j.vaccinated else 0
         return self.beta * (1 - e_m) * (1 - e_v)
 
+    def checkpoint(self, path):
+        """Save the full state of the run to directory `path`.
+
+        Population attributes and DataCollector rows go to .npy files (loaded
+        back memory-mapped); day, parameters, collector totals and the RNG
+        state go to meta.json. Dwell-time samplers, the event log and an
+        in-memory network are not saved; pass them to restore() again.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.environment.to_arrays().items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        snapshot = self.data_collector.snapshot()
+        for name in ("days", "counts", "incidence", "ever_infected"):
+            np.save(os.path.join(path, f"collector_{name}.npy"), snapshot[name])
+        # Pending transitions and the susceptible pool order feed the RNG
+        # draws, so they are saved as-is rather than rebuilt on restore
+        days = sorted(self._calendar)
+        ids = [np.asarray(self._calendar[day] if self._engine is None
+                          else np.concatenate(self._calendar[day]) if self._calendar[day] else [],
+                          dtype=np.int64) for day in days]
+        np.save(os.path.join(path, "calendar_days.npy"),
+                np.repeat(np.array(days, dtype=np.int64), [len(chunk) for chunk in ids]))
+        np.save(os.path.join(path, "calendar_ids.npy"),
+                np.concatenate(ids) if ids else np.empty(0, dtype=np.int64))
+        if self._engine is None:
+            np.save(os.path.join(path, "susceptible_pool.npy"), np.array(self._susceptible, dtype=np.int64))
+
+        if self._engine is not None:
+            rng_state = {"kind": "numpy", "state": self.rng.bit_generator.state}
+        else:
+            version, internal, gauss = self.rng.getstate()
+            rng_state = {"kind": "python", "state": [version, list(internal), gauss]}
+        network_dir = None
+        if self.network is not None and isinstance(self.network.indptr, np.memmap):
+            network_dir = os.path.dirname(os.path.abspath(self.network.indptr.filename))
+        meta = {
+            "version": 1,
+            "day": self.day,
+            "population": len(self.environment.population),
+            "engine": self.engine,
+            "compact": self.environment.compact,
+            "progression": self.progression,
+            "params": {name: getattr(self, name) for name in PARAMETERS},
+            "network": network_dir,
+            "collector": {"current": snapshot["current"], "cumulative": snapshot["cumulative"],
+                          "new_infections": snapshot["new_infections"],
+                          "track_incidence": self.data_collector.track_incidence},
+            "rng": rng_state,
+        }
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def restore(cls, path, seed=None, mmap=True, **overrides):
+        """Resume a run saved with checkpoint().
+
+        With seed=None the RNG continues exactly where the checkpoint left
+        off; a seed starts a fresh stream instead (used for forks). Population
+        arrays are memory-mapped copy-on-write unless mmap=False. Keyword
+        overrides may change any of RESTORE_OVERRIDES, e.g. a higher
+        mask_effect from the checkpoint day on.
+        """
+        unknown = set(overrides) - set(RESTORE_OVERRIDES)
+        if unknown:
+            raise ValueError(f"Cannot override {sorted(unknown)} on restore; allowed: {RESTORE_OVERRIDES}")
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        mode = "c" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                  for name in Environment.ARRAYS}
+        environment = Environment.from_arrays(arrays, compact=meta["compact"])
+        days = np.load(os.path.join(path, "collector_days.npy"))
+
+        kwargs = {**meta["params"], "network": meta["network"], **overrides}
+        sim = cls(population=meta["population"], engine=meta["engine"], compact=meta["compact"],
+                  progression=meta["progression"], seed=0 if seed is None else seed,
+                  horizon=max(len(days), 1) * 2,
+                  track_incidence=meta["collector"]["track_incidence"],
+                  environment=environment, **kwargs)
+        sim.day = meta["day"]
+        calendar_days = np.load(os.path.join(path, "calendar_days.npy"))
+        calendar_ids = np.load(os.path.join(path, "calendar_ids.npy"))
+        due_days, starts = np.unique(calendar_days, return_index=True)
+        sim._calendar = defaultdict(list)
+        for day, chunk in zip(due_days.tolist(), np.split(calendar_ids, starts[1:])):
+            sim._calendar[day] = [chunk] if sim._engine is not None else chunk.tolist()
+        if sim._engine is None:
+            sim._susceptible = np.load(os.path.join(path, "susceptible_pool.npy")).tolist()
+            sim._susceptible_pos = {i: pos for pos, i in enumerate(sim._susceptible)}
+        sim.data_collector.load_snapshot({
+            "days": days,
+            **{name: np.load(os.path.join(path, f"collector_{name}.npy"))
+               for name in ("counts", "incidence", "ever_infected")},
+            **{name: meta["collector"][name] for name in ("current", "cumulative", "new_infections")},
+        })
+        if seed is None:
+            rng = meta["rng"]
+            if rng["kind"] == "numpy":
+                sim.rng.bit_generator.state = rng["state"]
+            else:
+                version, internal, gauss = rng["state"]
+                sim.rng.setstate((version, tuple(internal), gauss))
+        return sim
+
+    def fork(self, n, seed=None, **param_overrides):
+        """Start `n` branches from the current state of this run.
+
+        Each branch is an independent Simulation with its own RNG stream
+        (reproducible from `seed`) and the given parameter overrides, so the
+        shared history is simulated once, e.g.
+        sim.fork(20, mask_effect=0.8) on day 60. For branches in other
+        processes, checkpoint() once and call restore(path, seed=...) there.
+        """
+        from ensemble import replicate_seed
+        base = np.random.SeedSequence(seed).entropy
+        with tempfile.TemporaryDirectory() as tmp:
+            self.checkpoint(tmp)
+            return [Simulation.restore(tmp, seed=replicate_seed(base, i), mmap=False, **param_overrides)
+                    for i in range(n)]
+
+    def close(self):
+        """Flush and close the transmission event log and profiler hooks, if any."""
+        if self.event_log is not None:
+            self.event_log.close()
+        if self.profiler is not None:
+            self.profiler.close()
+
+    def burned_out(self):
+        """True when no agent is in E or I, so only S→V can still happen."""
+        current = self.data_collector.current
+        return current[STATE_CODES['E']] + current[STATE_CODES['I']] == 0
+
+    def run(self, days, fast_forward=True, stop_early=False):
+        """Advance `days` days and return the number of days simulated.
+
+        Once the epidemic has burned out (see burned_out()), stop_early=True
+        ends the run there; otherwise, with fast_forward=True, the remaining
+        days skip transmission and progression and only draw the S→V flow,
+        still recording one DataCollector row per day. The object engine
+        makes the same random draws as step() would; the numpy engine draws
+        the daily counts from a binomial over the remaining susceptibles.
+        With a profiler attached fast-forward is off and every day goes
+        through step(), so profiler rows match the DataCollector rows.
+        """
+        fast_forward = fast_forward and self.profiler is None
+        for done in range(days):
+            if (fast_forward or stop_early) and self.burned_out():
+                if stop_early:
+                    return done
+                self._fast_forward(days - done)
+                return days
+            self.step()
+        return days
+
+    def _fast_forward(self, days):
+        self._calendar.clear()  # with no E or I agents every booking is stale
+        if self._engine is not None:
+            self._engine.fast_forward(self, days)
+            return
+        agents = self.environment.population
+        for _ in range(days):
+            self.day += 1
+            for i in self._sample_vaccinations():
+                self._transition(agents[i], 'V')
+            self.data_collector.record_day(self.day)
+
     def step(self):
         """Perform one day of simulation."""
         self.day += 1
+        prof = self.profiler
+        if prof is not None:
+            prof.start_day(self.day, self.data_collector.current)
+        if self._engine is not None:
+            self._engine.step(self)
+            self.data_collector.record_day(self.day)
+            if prof is not None:
+                prof.lap(RECORD)
+                prof.end_day(self.data_collector.current)
+            return
         agents = self.environment.population
+        # Agents exposed today only become infectious during progression,
+        # so the infectious set is fixed for the whole infection phase.
+        infectious = sorted(self._infectious)
 
         # Infection spread by random contacts
-        for agent in agents:
-            if agent.state == 'I':
-                contacts = random.sample(agents, k=min(10, len(agents)))
-                for other in contacts:
-                    if other.state == 'S':
-                        p = self.infection_probability(agent, other)
-                        if random.random() < p:
-                            other.state = 'E'
-        # Verification print statements
-        for agent in agents:
-            if agent.state == 'I':
-                contacts = random.sample(agents, k=min(10, len(agents)))
-                for other in contacts:
-                    if other.state == 'S':
-                        p = self.infection_probability(agent, other)
-                        if random.random() < p:
-                            other.state = 'E'
-                            print(f"Day {self.day}: Agent {agent.id} infected Agent {other.id} (p={p:.3f})")
-        # Disease progression
-        for agent in agents:
-            if agent.state == 'E' and random.random() < self.sigma:
-                agent.state = 'I'
-            elif agent.state == 'I' and random.random() < self.gamma:
-                agent.state = 'R'
-            elif agent.state == 'S' and random.random() < self.nu:
-                agent.state = 'V'
+        n_contacts = n_trials = 0
+        for i in infectious:
+            agent = agents[i]
+            if self.network is not None:
+                contacts = [agents[j] for j in self.network.neighbors(i).tolist()]
+            else:
+                contacts = self.rng.sample(agents, k=min(10, len(agents)))
+            n_contacts += len(contacts)
+            for other in contacts:
+                if other.state == 'S':
+                    n_trials += 1
+                    p = self.infection_probability(agent, other)
+                    if self.rng.random() < p:
+                        self._transition(other, 'E')
+                        if self.event_log is not None:
+                            self.event_log.record(self.day, agent.id, other.id, p)
+        if prof is not None:
+            prof.count(CONTACTS_DRAWN, n_contacts)
+            prof.count(TRIALS, n_trials)
+            prof.lap(TRANSMISSION)
+        # Disease progression: E→I over today's exposed (including agents
+        # exposed this morning), I→R over the infectious set from the start
+        # of the day, S→V over the susceptibles left after infection.
+        if self.progression == "scheduled":
+            self._process_due(agents)
+        else:
+            for i in sorted(self._exposed):
+                if self.rng.random() < self.sigma:
+                    self._transition(agents[i], 'I')
+            for i in infectious:
+                if self.rng.random() < self.gamma:
+                    self._transition(agents[i], 'R')
+        if prof is not None:
+            prof.lap(PROGRESSION)
+        for i in self._sample_vaccinations():
+            self._transition(agents[i], 'V')
+        if prof is not None:
+            prof.lap(VACCINATION)
 
         # Record daily counts
-        self.data_collector.record(self.day, agents)
+        self.data_collector.record_day(self.day)
+        if prof is not None:
+            prof.lap(RECORD)
+            prof.end_day(self.data_collector.current)
@@ -0,0 +1,207 @@
+# sweep.py
+#
+# Parameter sweeps over the model parameters of Simulation (beta, sigma,
+# gamma, nu, mask_effect, vaccine_effect, mask_rate, vaccine_rate). Every (point, replicate)
+# pair is a task for a process pool; each finished point is written to its
+# own .npz shard named after a hash of its parameters and the run
+# configuration (population, timesteps, replicates, seed, adaptive options),
+# so a killed sweep resumes by skipping the shards that already exist, and a
+# sweep with a different configuration never reuses them.
+
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import numpy as np
+from agent import STATES
+from ensemble import replicate_seed, run_replicate, imap_window
+from ensemble_stats import ConvergenceTracker, TARGETS
+
+# Model parameters only: run setup (engine, population, horizon, ...) is a
+# run_sweep argument, and objects such as networks have no stable hash
+SWEEPABLE = ("beta", "sigma", "gamma", "nu", "mask_effect", "vaccine_effect", "mask_rate", "vaccine_rate")
+
+
+def grid_design(**axes):
+    """Full factorial design: grid_design(beta=[0.1, 0.2], nu=[0.0, 0.02])."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def random_design(n, bounds, seed=None):
+    """n points drawn uniformly inside bounds = {name: (low, high)}."""
+    rng = np.random.default_rng(seed)
+    return [{name: float(rng.uniform(low, high)) for name, (low, high) in bounds.items()}
+            for _ in range(n)]
+
+
+def latin_hypercube_design(n, bounds, seed=None):
+    """n-point Latin hypercube: every parameter range is cut into n strata
+    and each stratum is used exactly once."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, (low, high) in bounds.items():
+        strata = (rng.permutation(n) + rng.random(n)) / n
+        columns[name] = low + strata * (high - low)
+    return [{name: float(columns[name][i]) for name in bounds} for i in range(n)]
+
+
+def point_key(params, run=None):
+    """Stable hash of a parameter point and its run configuration (population,
+    timesteps, ...), used as its shard name. Without `run` only the
+    parameters are hashed; that key picks the point's random streams."""
+    canonical = json.dumps(params if run is None else {"params": params, "run": run}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _check_params(params):
+    unknown = set(params) - set(SWEEPABLE)
+    if unknown:
+        raise ValueError(f"Cannot sweep {sorted(unknown)}; sweepable parameters are {SWEEPABLE}")
+
+
+def _run_task(task):
+    key, r, seed, population, timesteps, params, engine = task
+    sim_kwargs = params if engine is None else {**params, "engine": engine}
+    return key, r, seed, run_replicate((seed, population, timesteps, sim_kwargs))
+
+
+def _write_shard(store_dir, key, params, run, seeds, counts):
+    path = os.path.join(store_dir, f"{key}.npz")
+    tmp = os.path.join(store_dir, f".{key}.{os.getpid()}.tmp.npz")
+    np.savez(tmp, params=json.dumps(params, sort_keys=True), run=json.dumps(run, sort_keys=True, default=str),
+             seeds=np.array([str(s) for s in seeds]), counts=np.stack(counts))
+    os.replace(tmp, path)  # atomic: a shard is either complete or absent
+
+
+def run_sweep(design, n_replicates=10, population=1000, timesteps=200,
+              store_dir="sweep_results", n_workers=1, seed=0, base_params=None,
+              tol=None, min_runs=10, targets=TARGETS, engine=None):
+    """Run every point of `design` n_replicates times and store one shard per point.
+
+    design: list of parameter dicts (see grid_design / random_design /
+    latin_hypercube_design), merged over `base_params`. Points whose shard
+    already exists in `store_dir` are skipped, so rerunning the same call
+    after a crash only computes what is missing; the shard name covers the
+    run configuration too, so a call with another population, timesteps,
+    n_replicates, seed or tol/min_runs/targets computes fresh shards.
+    Replicate seeds depend on (seed, point, replicate index), never on
+    scheduling.
+    Returns the list of point keys in design order.
+
+    tol: adaptive mode. Each point runs replicates until its targets'
+    confidence intervals are within `tol` (see run_multiple), with
+    n_replicates as the cap, so stable points stop early and noisy ones get
+    more runs. summarize() reports the replicates each point needed.
+
+    engine: Simulation engine ("object", "numpy") or "tau" for the
+    compartmental surrogate; None uses Simulation's default.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    run = {"population": population, "timesteps": timesteps, "n_replicates": n_replicates, "seed": seed}
+    if engine is not None:
+        run["engine"] = engine
+    if tol is not None:
+        run.update(tol=tol, min_runs=min_runs, targets=list(targets))
+    points, streams = {}, {}
+    for point in design:
+        params = {**(base_params or {}), **point}
+        _check_params(params)
+        key = point_key(params, run)
+        points[key], streams[key] = params, int(point_key(params)[:8], 16)
+    todo = [key for key in points if not os.path.exists(os.path.join(store_dir, f"{key}.npz"))]
+    print(f"[INFO] Sweep: {len(points)} points, {len(points) - len(todo)} already stored, "
+          f"{len(todo)} to run x {n_replicates} replicates")
+
+    # Point-major task order keeps few partially-finished points in memory
+    tasks = ((key, r, replicate_seed(seed, streams[key], r), population, timesteps, points[key], engine)
+             for key in todo for r in range(n_replicates))
+    partial = {}
+
+    def collect(results):
+        for key, r, rep_seed, counts in results:
+            seeds, runs = partial.setdefault(key, ([None] * n_replicates, [None] * n_replicates))
+            seeds[r], runs[r] = rep_seed, counts
+            if all(run is not None for run in runs):
+                _write_shard(store_dir, key, points[key], run, seeds, runs)
+                del partial[key]
+
+    if tol is not None:
+        _run_adaptive(points, streams, run, todo, store_dir, n_workers,
+                      dict(tol=tol, min_runs=min_runs, targets=targets))
+    elif n_workers <= 1:
+        collect(map(_run_task, tasks))
+    else:
+        with multiprocessing.get_context().Pool(n_workers) as pool:
+            collect(pool.imap_unordered(_run_task, tasks, chunksize=1))
+    print(f"[INFO] Sweep complete; results in {store_dir}")
+    return list(points)
+
+
+def _run_adaptive(points, streams, run, todo, store_dir, n_workers, tracker_kwargs):
+    """Points one at a time, each running replicates in order until converged."""
+    max_runs, timesteps = run["n_replicates"], run["timesteps"]
+    pool = multiprocessing.get_context().Pool(n_workers) if n_workers > 1 else None
+    total = 0
+    try:
+        for key in todo:
+            tracker = ConvergenceTracker(timesteps, **tracker_kwargs)
+            tasks = ((key, r, replicate_seed(run["seed"], streams[key], r), run["population"], timesteps,
+                      points[key], run.get("engine")) for r in range(max_runs))
+            results = map(_run_task, tasks) if pool is None else imap_window(pool, _run_task, tasks, 2 * n_workers)
+            seeds, runs = [], []
+            for _, _, rep_seed, counts in results:
+                seeds.append(rep_seed)
+                runs.append(counts)
+                tracker.add(counts)
+                if tracker.converged():
+                    break
+            _write_shard(store_dir, key, points[key], run, seeds, runs)
+            total += len(runs)
+            print(f"[INFO] Point {key}: {len(runs)} replicates"
+                  f"{'' if tracker.converged() else ' (cap reached before converging)'}")
+    finally:
+        if pool is not None:
+            pool.terminate()
+    print(f"[INFO] Adaptive sweep ran {total} replicates ({len(todo) * max_runs} at the cap)")
+
+
+def load_point(store_dir, key):
+    """Return (params, counts) for one stored point; counts is (replicates, timesteps, 5).
+    The shard's run configuration is in load_run(store_dir, key)."""
+    with np.load(os.path.join(store_dir, f"{key}.npz")) as shard:
+        return json.loads(str(shard["params"])), shard["counts"]
+
+
+def load_run(store_dir, key):
+    """The run configuration (population, timesteps, ...) a stored point was computed with."""
+    with np.load(os.path.join(store_dir, f"{key}.npz")) as shard:
+        return json.loads(str(shard["run"])) if "run" in shard else {}
+
+
+def summarize(store_dir):
+    """One DataFrame row per stored point: parameters plus replicate means of
+    peak infected, day of peak and final recovered."""
+    import pandas as pd
+    rows = []
+    for name in sorted(os.listdir(store_dir)):
+        if not name.endswith(".npz") or name.startswith("."):
+            continue
+        key = name[:-4]
+        params, counts = load_point(store_dir, key)
+        run = load_run(store_dir, key)
+        infected = counts[:, :, STATES.index('I')]
+        rows.append({"key": key, **params, "population": run.get("population"), "timesteps": counts.shape[1],
+                     "replicates": len(counts),
+                     "peak_I": infected.max(axis=1).mean(),
+                     "peak_day": (infected.argmax(axis=1) + 1).mean(),
+                     "final_R": counts[:, -1, STATES.index('R')].mean()})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from ensemble import config_params
+    design = grid_design(mask_effect=[0.0, 0.3, 0.6], vaccine_effect=[0.5, 0.85])
+    run_sweep(design, n_replicates=10, base_params=config_params(), n_workers=os.cpu_count())
+    print(summarize("sweep_results"))
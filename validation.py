@@ -1,31 +1,20 @@
 # validation.py
 import numpy as np
-from scipy.integrate import odeint
-import matplotlib.pyplot as plt
 import datetime
 import os
-import pandas as pd
+from ode import seirv_ode, solve_seirv
+from agent import STATES
 
 def log(msg):
     print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
 
-def seirv_ode(y, t, beta, sigma, gamma, nu):
-    # y = [S, E, I, R, V]
-    S, E, I, R, V = y
-    N = S + E + I + R + V
-    if N <= 0:
-        # avoid division by zero
-        return [0, 0, 0, 0, 0]
-    dSdt = -beta * S * I / N - nu * S
-    dEdt = beta * S * I / N - sigma * E
-    dIdt = sigma * E - gamma * I
-    dRdt = gamma * I
-    dVdt = nu * S
-    return [dSdt, dEdt, dIdt, dRdt, dVdt]
-
 def run_validation(beta=0.10, sigma=0.20, gamma=0.14, nu=0.02,
                    N=1000, E0=1, I0=1, R0=0, V0=0, days=200,
-                   overlay_abm=True, abm_csv="simulation_results.csv"):
+                   overlay_abm=True, abm_csv="simulation_results.csv", abm_key=None):
+    """Solve and plot the SEIRV ODE, optionally overlaying an ABM run from
+    `abm_csv` or, with `abm_key`, from the run cache (see run_cache.py)."""
+    import matplotlib.pyplot as plt
+    import pandas as pd
     log("Starting SEIRV ODE validation...")
 
     # initial conditions
@@ -36,8 +25,8 @@ def run_validation(beta=0.10, sigma=0.20, gamma=0.14, nu=0.02,
     log(f"Parameters: beta={beta}, sigma={sigma}, gamma={gamma}, nu={nu}, N={N}")
     log(f"Initial conditions (S,E,I,R,V): {y0}")
 
-    # solve ODE
-    sol = odeint(seirv_ode, y0, t, args=(beta, sigma, gamma, nu))
+    # solve ODE (cached; repeated validations reuse the solution)
+    sol = solve_seirv(t, beta, sigma, gamma, nu, N=N, E0=E0, I0=I0, R0=R0, V0=V0)
     S, E, I, R, V = sol.T
 
     # diagnostics
@@ -51,8 +40,14 @@ def run_validation(beta=0.10, sigma=0.20, gamma=0.14, nu=0.02,
     plt.plot(t, R, label='Recovered (ODE)', color='green')
     plt.plot(t, V, label='Vaccinated (ODE)', color='purple')
 
-    # optionally overlay ABM results if CSV exists
-    if overlay_abm and os.path.exists(abm_csv):
+    # optionally overlay ABM results from the run cache or if CSV exists
+    if overlay_abm and abm_key is not None:
+        from data_collector import load_data
+        df = load_data(key=abm_key)
+        if df is not None:
+            plt.plot(df['day'], df['I'], 'k--', label='ABM Infected (cached run)')
+            log(f"Overlaying ABM results from cached run {abm_key}")
+    elif overlay_abm and os.path.exists(abm_csv):
         try:
             df = pd.read_csv(abm_csv)
             if 'day' in df.columns and 'I' in df.columns:
@@ -78,6 +73,241 @@ def run_validation(beta=0.10, sigma=0.20, gamma=0.14, nu=0.02,
     else:
         log("Population conserved throughout simulation.")
 
+def compare_engines(n_runs=500, population=1000, days=200, alpha=0.01, seed=0, outbreak=0.05, **params):
+    """Statistical equivalence check of the numpy engine against the object engine.
+
+    Runs `n_runs` replicates of each engine (beta defaults to 0.4, so most
+    runs take off; other Simulation parameters can be passed as keywords).
+    A run is an outbreak when more than `outbreak` of the population was
+    ever infected. Compares the share of outbreaks (Fisher's exact test) and,
+    over outbreaks only, the distributions of peak infected, day of peak and
+    final recovered with two-sample KS tests, so runs that die out at once
+    cannot mask a difference in the epidemics themselves.
+    Returns the p-values; raises AssertionError if any falls below `alpha`.
+    """
+    from scipy.stats import ks_2samp, fisher_exact
+    from simulation import Simulation
+
+    params.setdefault("beta", 0.4)
+    log(f"Comparing engines over {n_runs} runs (N={population}, days={days}, beta={params['beta']})")
+    outcomes = {}
+    for engine in ("object", "numpy"):
+        runs = []
+        for r in range(n_runs):
+            sim = Simulation(population=population, engine=engine, seed=seed + r, horizon=days, **params)
+            sim.run(days)
+            runs.append(sim.data_collector.to_array())
+        runs = np.array(runs)
+        final = runs[:, -1]
+        took_off = population - final[:, STATES.index('S')] - final[:, STATES.index('V')] > outbreak * population
+        infected = runs[took_off, :, STATES.index('I')]
+        outcomes[engine] = {"took_off": took_off, "peak_I": infected.max(axis=1),
+                            "peak_day": infected.argmax(axis=1),
+                            "final_R": final[took_off, STATES.index('R')]}
+
+    p_values = {}
+    a, b = outcomes["object"]["took_off"], outcomes["numpy"]["took_off"]
+    p_values["outbreaks"] = fisher_exact([[a.sum(), (~a).sum()], [b.sum(), (~b).sum()]]).pvalue
+    log(f"outbreaks: object {a.mean():.1%}, numpy {b.mean():.1%}, Fisher p={p_values['outbreaks']:.3f}")
+    assert min(a.sum(), b.sum()) >= 20, "Too few outbreaks to compare; raise n_runs or beta"
+    for metric in ("peak_I", "peak_day", "final_R"):
+        a, b = outcomes["object"][metric], outcomes["numpy"][metric]
+        p_values[metric] = ks_2samp(a, b).pvalue
+        log(f"{metric} (outbreaks): object mean={np.mean(a):.1f}, numpy mean={np.mean(b):.1f}, "
+            f"KS p={p_values[metric]:.3f}")
+
+    failed = [m for m, p in p_values.items() if p < alpha]
+    assert not failed, f"Engines differ on {failed} (alpha={alpha})"
+    log("Engines statistically equivalent.")
+    return p_values
+
+def compare_compartmental(method="tau", n_runs=300, population=1000, days=200, alpha=0.01,
+                          seed=0, **params):
+    """Compare the compartmental surrogate (compartmental.py) with the numpy
+    ABM ensemble: KS tests on peak infected, day of peak and final recovered.
+    beta defaults to 0.4 so most runs take off.
+
+    method="tau" follows the ABM's daily update and should match it.
+    method="gillespie" is the continuous-time analogue; its exponential
+    dwell times do not match the ABM's daily ones, and at epidemic beta it
+    fails this check (smaller peaks and final sizes), which is why ensembles and
+    sweeps do not offer it.
+    Returns the p-values; raises AssertionError if any falls below `alpha`.
+    """
+    import time
+    from scipy.stats import ks_2samp
+    from ensemble import iter_replicates
+    import compartmental
+
+    params.setdefault("beta", 0.4)
+    log(f"Comparing {method} surrogate with the ABM over {n_runs} runs (N={population}, days={days})")
+    outcomes = {}
+    for engine in ("numpy", method):
+        start = time.perf_counter()
+        if engine == "numpy":
+            runs = iter_replicates(n_runs, population, days, seed=seed, engine=engine, **params)
+        else:
+            runs = compartmental.iter_replicates(n_runs, population, days, method=method, seed=seed, **params)
+        runs = np.array(list(runs))
+        log(f"{engine}: {(time.perf_counter() - start) / n_runs * 1000:.2f} ms per replicate")
+        infected = runs[:, :, STATES.index('I')]
+        outcomes[engine] = {"peak_I": infected.max(axis=1), "peak_day": infected.argmax(axis=1),
+                            "final_R": runs[:, -1, STATES.index('R')]}
+
+    p_values = {}
+    for metric in ("peak_I", "peak_day", "final_R"):
+        a, b = outcomes["numpy"][metric], outcomes[method][metric]
+        p_values[metric] = ks_2samp(a, b).pvalue
+        log(f"{metric}: ABM mean={np.mean(a):.1f}, {method} mean={np.mean(b):.1f}, KS p={p_values[metric]:.3f}")
+
+    failed = [m for m, p in p_values.items() if p < alpha]
+    assert not failed, f"{method} surrogate differs from the ABM on {failed} (alpha={alpha})"
+    log("Surrogate statistically equivalent to the ABM.")
+    return p_values
+
+def compare_fast_forward(n_runs=100, population=10000, days=200, alpha=0.01, seed=0, **params):
+    """Check that Simulation.run's burn-out fast-forward leaves the numpy
+    engine's S and V trajectories statistically unchanged. Other Simulation
+    parameters can be passed as keywords.
+
+    Runs each seed once with plain step() calls and once with run(), and
+    compares final S and V (and S on the middle day) with KS tests. The
+    object engine's fast-forward makes the same draws as step(), so its runs
+    must match exactly; one run of it is compared row by row.
+    """
+    from scipy.stats import ks_2samp
+    from simulation import Simulation
+
+    log(f"Comparing step() and fast-forwarded run() over {n_runs} runs (N={population}, days={days})")
+    stepped, forwarded = [], []
+    for r in range(n_runs):
+        for runs, fast in ((stepped, False), (forwarded, True)):
+            sim = Simulation(population=population, engine="numpy", seed=seed + r, **params)
+            sim.run(days, fast_forward=fast)
+            runs.append(sim.data_collector.to_array())
+    stepped, forwarded = np.array(stepped), np.array(forwarded)
+
+    p_values = {}
+    for name, column, day in (("final_S", 0, -1), ("final_V", 4, -1), ("mid_S", 0, days // 2)):
+        p_values[name] = ks_2samp(stepped[:, day, column], forwarded[:, day, column]).pvalue
+        log(f"{name}: step mean={stepped[:, day, column].mean():.1f}, "
+            f"run mean={forwarded[:, day, column].mean():.1f}, KS p={p_values[name]:.3f}")
+
+    a = Simulation(population=population, seed=seed, **params)
+    b = Simulation(population=population, seed=seed, **params)
+    for _ in range(days):
+        a.step()
+    b.run(days)
+    assert a.data_collector.records == b.data_collector.records, "Object engine fast-forward changed the run"
+
+    failed = [m for m, p in p_values.items() if p < alpha]
+    assert not failed, f"Fast-forward changes {failed} (alpha={alpha})"
+    log("Fast-forward statistically equivalent.")
+    return p_values
+
+
+def compare_sharded(n_runs=40, population=2000, days=150, beta=0.3, alpha=0.01, seed=0, **params):
+    """Check that ShardedSimulation gives the same run for any worker count
+    and matches the numpy engine's final R and V distributions (KS test).
+    Other model parameters (sigma, gamma, nu, mask/vaccine effects and
+    rates) can be passed as keywords."""
+    from scipy.stats import ks_2samp
+    from simulation import Simulation
+    from sharded import ShardedSimulation
+
+    runs = []
+    for n_workers in (1, 2, 3):
+        with ShardedSimulation(population=population, beta=beta, seed=seed, n_workers=n_workers,
+                               n_shards=6, **params) as sim:
+            sim.run(days)
+            runs.append(sim.data_collector.to_array())
+    assert all(np.array_equal(runs[0], r) for r in runs[1:]), "Sharded run depends on the worker count"
+    log("Sharded runs identical for 1, 2 and 3 workers.")
+
+    log(f"Comparing sharded and numpy engines over {n_runs} runs (N={population}, days={days})")
+    sharded, numpy_runs = [], []
+    for r in range(n_runs):
+        with ShardedSimulation(population=population, beta=beta, seed=seed + r, n_workers=1,
+                               n_shards=4, **params) as sim:
+            sim.run(days)
+            sharded.append(sim.data_collector.current)
+        sim = Simulation(population=population, beta=beta, engine="numpy", seed=seed + r, **params)
+        sim.run(days)
+        numpy_runs.append(sim.data_collector.current)
+    sharded, numpy_runs = np.array(sharded), np.array(numpy_runs)
+
+    p_values = {}
+    for name, column in (("final_R", 3), ("final_V", 4)):
+        p_values[name] = ks_2samp(sharded[:, column], numpy_runs[:, column]).pvalue
+        log(f"{name}: sharded mean={sharded[:, column].mean():.1f}, "
+            f"numpy mean={numpy_runs[:, column].mean():.1f}, KS p={p_values[name]:.3f}")
+    failed = [m for m, p in p_values.items() if p < alpha]
+    assert not failed, f"Sharded engine differs on {failed} (alpha={alpha})"
+    log("Sharded engine statistically equivalent.")
+    return p_values
+
+def check_calibration(beta=0.25, population=3000, days=100, n_particles=100, generations=5,
+                      n_workers=1, seed=0, **params):
+    """Calibrate beta (calibration.abc_smc) to the mean infected curve of
+    outbreak runs at a known beta; the truth must lie in the 90% posterior
+    interval. Other model parameters are passed as keywords and held fixed."""
+    from calibration import abc_smc, posterior_summary
+    from ensemble import iter_replicates, config_params
+
+    params = {**config_params(), **params, "beta": beta}
+    runs = np.array(list(iter_replicates(60, population, days, seed=seed, engine="numpy", **params)))
+    infected = runs[:, :, STATES.index('I')]
+    outbreaks = infected[infected.max(axis=1) > 50]
+    assert len(outbreaks), f"No outbreak (peak I > 50) in 60 runs at beta={beta}, N={population}"
+    observed = np.round(outbreaks.mean(axis=0))
+    log(f"Calibrating beta to the mean outbreak curve at beta={beta} (N={population}, days={days})")
+    result = abc_smc(observed, population, priors={"beta": (0.01, 1.0)}, n_particles=n_particles,
+                     generations=generations, n_workers=n_workers, seed=seed + 1,
+                     sim_kwargs={k: v for k, v in params.items() if k != "beta"})
+    summary = posterior_summary(result)["beta"]
+    log(f"Posterior beta: mean={summary['mean']:.3f}, 90% interval [{summary['q05']:.3f}, {summary['q95']:.3f}]")
+    assert summary["q05"] <= beta <= summary["q95"], f"True beta {beta} outside the 90% posterior interval"
+    log("Calibration recovers beta.")
+    return summary
+
+STARTUP_BUDGET_S = 0.5        # import of the CLI and the simulation stack
+IMPORT_RSS_BUDGET_MB = 60     # peak RSS after a short headless simulate
+
+_STARTUP_PROBE = """
+import json, resource, sys, tempfile, time, os
+start = time.perf_counter()
+import cli, simulation, ensemble, run_cache
+elapsed = time.perf_counter() - start
+with tempfile.TemporaryDirectory() as tmp:
+    cli.main(["simulate", "--no-cache", "--days", "5", "--out", os.path.join(tmp, "counts.npy")])
+print(json.dumps({"seconds": elapsed, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "heavy": [m for m in ("pandas", "matplotlib", "scipy") if m in sys.modules]}))
+"""
+
+def check_startup(budget_s=STARTUP_BUDGET_S, budget_rss_mb=IMPORT_RSS_BUDGET_MB, repeats=3):
+    """Check the headless startup budget in fresh interpreters: importing
+    cli / simulation / ensemble / run_cache (best of `repeats`) must take at
+    most `budget_s`, and a short `cli.py simulate` must stay under
+    `budget_rss_mb` of peak RSS without loading pandas, matplotlib or scipy."""
+    import json
+    import subprocess
+    import sys
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=here, check=True,
+                             capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    seconds = min(r["seconds"] for r in results)
+    rss = max(r["rss_mb"] for r in results)
+    heavy = sorted({m for r in results for m in r["heavy"]})
+    log(f"Startup: import {seconds * 1000:.0f} ms (budget {budget_s * 1000:.0f}), "
+        f"peak RSS {rss:.0f} MB (budget {budget_rss_mb}), heavy modules loaded: {heavy or 'none'}")
+    assert not heavy, f"Headless simulate imported {heavy}"
+    assert seconds <= budget_s, f"Import took {seconds:.3f}s, budget {budget_s}s"
+    assert rss <= budget_rss_mb, f"Peak RSS {rss:.0f} MB, budget {budget_rss_mb} MB"
+    return {"seconds": seconds, "rss_mb": rss}
+
 if __name__ == "__main__":
     # default run: small nonzero E0 & I0 so infection can start
     run_validation()
@@ -2,10 +2,21 @@
 
 import matplotlib.pyplot as plt
 import pandas as pd
+from data_collector import load_data
 
-def plot_epidemic_curve(csv_file="simulation_results.csv"):
-    """Plot infection dynamics over time."""
-    df = pd.read_csv(csv_file)
+def plot_epidemic_curve(csv_file="simulation_results.csv", out=None, key=None):
+    """Plot infection dynamics over time.
+
+    With `out` (e.g. "curve.png") the figure is rendered headless to that
+    file instead of opening a window (see render.py). With `key` the run is
+    read from the run cache instead of `csv_file`.
+    """
+    df = load_data(csv_file, key=key) if key is not None else None
+    if out is not None:
+        from render import render_curve
+        return render_curve(csv_file if df is None else df, out)
+    if df is None:
+        df = pd.read_csv(csv_file)
     plt.figure(figsize=(8, 4))
     plt.plot(df["day"], df["S"], label="Susceptible")
     plt.plot(df["day"], df["E"], label="Exposed")